@@ -3,14 +3,98 @@ Educational AI Agent Orchestrator
 Implements the core agentic reasoning and tool coordination
 """
 
-from typing import Dict, List, Any, Optional
+from typing import Dict, List, Any, Optional, Tuple, Iterator, Generator
 from datetime import datetime
-import anthropic
-from langchain.schema import HumanMessage, AIMessage, SystemMessage
-from .tools import WebSearchTool, MemoryTool, AnalyticsTool
-from .prompts import SYSTEM_PROMPT, EDUCATIONAL_GUIDELINES
+from collections import deque
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
+import os
+import re
+import threading
+from .tools import MemoryTool, AnalyticsTool, WEB_SEARCH, KB
+from .prompts import (
+    SYSTEM_PROMPT, EDUCATIONAL_GUIDELINES, TOPIC_KEYWORDS, CURRENT_INFO_KEYWORDS
+)
 from memory.session import SessionManager
-from memory.profiles import StudentProfileManager
+from memory.profiles import get_profile_manager
+from memory.cache import SemanticCache, CentroidCache
+from utils.clock import fast_iso_now
+
+
+# Topic matcher built once at import: all keywords in a single caseless
+# alternation, wrapped in a lookahead so overlapping keywords are all
+# reported in one pass. Each keyword has its own group, so a match's
+# lastindex names its topic without lowercasing the text.
+_KEYWORD_TOPICS = {
+    keyword: topic
+    for topic, keywords in TOPIC_KEYWORDS
+    for keyword in keywords
+}
+_TOPIC_KEYWORDS_BY_LENGTH = sorted(_KEYWORD_TOPICS, key=len, reverse=True)
+_TOPIC_RE = re.compile(
+    '(?=(?:' + '|'.join(
+        f'({re.escape(keyword)})' for keyword in _TOPIC_KEYWORDS_BY_LENGTH
+    ) + '))',
+    re.IGNORECASE
+)
+_GROUP_TOPICS = (None,) + tuple(
+    _KEYWORD_TOPICS[keyword] for keyword in _TOPIC_KEYWORDS_BY_LENGTH
+)
+
+# Student levels in ascending order
+_LEVELS = ('Beginner', 'Intermediate', 'Advanced', 'Expert')
+
+# Whole-word (optionally plural) match of any current-information keyword
+_SEARCH_RE = re.compile(
+    rf"\b(?:{'|'.join(map(re.escape, CURRENT_INFO_KEYWORDS))})s?\b",
+    re.IGNORECASE
+)
+
+@lru_cache(maxsize=4)
+def _get_client(api_key: str):
+    """
+    Get the Anthropic client for an API key, shared by all orchestrators
+    so sessions reuse one HTTP connection pool
+    """
+    # Imported lazily: the SDK is heavy and only needed once an
+    # orchestrator is actually constructed
+    import anthropic
+    
+    return anthropic.Anthropic(api_key=api_key)
+
+
+@lru_cache(maxsize=64)
+def _compose_prompt(
+    level: str,
+    progress: int,
+    topics_text: str,
+    recent_context: str
+) -> str:
+    """Compose the system prompt; repeated student states reuse the cached string"""
+    return SYSTEM_PROMPT + f"""
+
+Student Profile:
+- Level: {level}
+- Progress: {progress}%
+- Previously Learned Topics: {topics_text or 'None yet'}
+
+Recent Conversation Context:
+{recent_context}
+
+{EDUCATIONAL_GUIDELINES}
+"""
+
+
+# Runs web searches alongside the rest of a turn; searches may wait on the
+# provider's rate limit, so nothing else shares these workers
+_SEARCH_EXECUTOR = ThreadPoolExecutor(max_workers=8, thread_name_prefix='web-search')
+
+# Responses reused for near-duplicate questions from students at the same
+# level. Off unless RESPONSE_CACHE_ENABLED=1: the hashed bag-of-words
+# embedding can't tell "backprop in Python" from "backprop in Java", so the
+# threshold is strict
+RESPONSE_CACHE_ENABLED = os.getenv('RESPONSE_CACHE_ENABLED') == '1'
+_RESPONSE_CACHE = CentroidCache(threshold=0.97)
 
 
 class EducationalAgentOrchestrator:
@@ -26,20 +110,25 @@ class EducationalAgentOrchestrator:
         self,
         anthropic_api_key: str,
         student_id: str,
-        session_id: Optional[str] = None
+        session_id: Optional[str] = None,
+        response_cache: Optional[SemanticCache] = None
     ):
-        self.client = anthropic.Anthropic(api_key=anthropic_api_key)
+        self.client = _get_client(anthropic_api_key)
         self.student_id = student_id
         self.session_id = session_id or self._generate_session_id()
         
         # Initialize tools (Tool interoperability)
-        self.web_search = WebSearchTool()
+        self.web_search = WEB_SEARCH
         self.memory = MemoryTool(student_id=student_id)
         self.analytics = AnalyticsTool(student_id=student_id)
+        self.knowledge_base = KB
         
         # Session and context management
         self.session_manager = SessionManager(self.session_id)
-        self.profile_manager = StudentProfileManager(student_id)
+        self.profile_manager = get_profile_manager(student_id)
+        if response_cache is None and RESPONSE_CACHE_ENABLED:
+            response_cache = _RESPONSE_CACHE
+        self.response_cache = response_cache
         
         # Initialize student profile
         self.student_profile = self.profile_manager.get_or_create_profile()
@@ -48,11 +137,16 @@ class EducationalAgentOrchestrator:
         self.tools = {
             'web_search': self.web_search,
             'memory_retrieve': self.memory,
-            'analytics_update': self.analytics
+            'analytics_update': self.analytics,
+            'knowledge_base': self.knowledge_base
         }
         
-        # Conversation history for context
-        self.conversation_history = []
+        # Conversation history for context (last 5 exchanges)
+        self.conversation_history = deque(maxlen=10)
+        
+        # Turns run in worker threads; one at a time per orchestrator so
+        # concurrent requests for a session can't interleave their updates
+        self._turn_lock = threading.Lock()
         
     def _generate_session_id(self) -> str:
         """Generate unique session identifier"""
@@ -75,46 +169,86 @@ class EducationalAgentOrchestrator:
         Returns:
             Response dict with message, tools used, and updated context
         """
-        # Step 1: Collect real-time data (flowchart step 2)
-        self._collect_session_data(user_message)
+        for _, result in self.stream_message(user_message, allow_web_search, teacher_override):
+            pass
+        return result
+    
+    def stream_message(
+        self,
+        user_message: str,
+        allow_web_search: bool = True,
+        teacher_override: Optional[Dict[str, Any]] = None
+    ) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """
+        Process user message, yielding the response text as it is generated
         
-        # Step 2: Retrieve relevant context from memory
-        relevant_context = self._retrieve_context(user_message)
+        Args:
+            user_message: The student's question/message
+            allow_web_search: Whether to allow web search (for current info)
+            teacher_override: Optional teacher guidance/corrections
+            
+        Yields:
+            (text_delta, None) for each chunk of the response, then
+            ('', response_dict) once the turn is complete
+        """
+        with self._turn_lock:
+            yield from self._stream_turn(user_message, allow_web_search, teacher_override)
+    
+    def _stream_turn(
+        self,
+        user_message: str,
+        allow_web_search: bool,
+        teacher_override: Optional[Dict[str, Any]]
+    ) -> Iterator[Tuple[str, Optional[Dict[str, Any]]]]:
+        """Run one turn for stream_message (the caller holds the turn lock)"""
+        # One logical timestamp shared by every record of this turn
+        now_iso = fast_iso_now()
+        
+        # Step 1: Collect real-time data (flowchart step 2)
+        self._collect_session_data(user_message, now_iso)
         
-        # Step 3: Apply teacher override if present (flowchart step 3)
+        # Step 2: Apply teacher override if present (flowchart step 3)
         if teacher_override:
-            return self._apply_teacher_override(teacher_override)
+            yield '', self._apply_teacher_override(teacher_override, now_iso)
+            return
         
-        # Step 4: Determine if we need additional tools
-        needs_search = self._should_search(user_message, allow_web_search)
+        # Step 3: Determine which tools to use; a web search runs in the
+        # background while context is retrieved, so the turn waits for the
+        # slower of the two rather than their sum
+        search_future = None
+        if self._should_search(user_message, allow_web_search):
+            search_future = _SEARCH_EXECUTOR.submit(self.web_search.search, user_message)
+        
+        # Step 4: Retrieve relevant context from memory
+        relevant_context = self._retrieve_context(user_message)
         
         # Step 5: Execute agentic reasoning with Claude
-        response = self._generate_response(
+        response = yield from self._generate_response(
             user_message=user_message,
             context=relevant_context,
-            use_search=needs_search
+            search_results=self._tool_result(search_future)
         )
         
         # Step 6: Update long-term learning graph (flowchart step 4)
-        self._update_learning_graph(user_message, response)
+        self._update_learning_graph(user_message, response, now_iso)
         
         # Step 7: Update session and analytics
-        self._update_session(user_message, response)
+        self._update_session(user_message, response, now_iso)
         
-        return {
+        yield '', {
             'message': response['content'],
             'tools_used': response['tools_used'],
             'topics_detected': response['topics'],
             'student_level': self.student_profile['level'],
             'progress': self.student_profile['progress'],
             'session_id': self.session_id,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': now_iso
         }
     
-    def _collect_session_data(self, user_message: str):
+    def _collect_session_data(self, user_message: str, timestamp: Optional[str] = None):
         """Collect real-time feedback during session (Flowchart Step 2)"""
         session_data = {
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': timestamp or fast_iso_now(),
             'message': user_message,
             'student_level': self.student_profile['level'],
             'topics_explored': self.student_profile.get('topics', [])
@@ -135,32 +269,38 @@ class EducationalAgentOrchestrator:
         return {
             'recent_conversation': recent_history,
             'learned_topics': learned_topics,
+            'learned_topics_text': self.profile_manager.get_topics_text(),
             'similar_past_queries': similar_queries,
             'student_level': self.student_profile['level'],
             'progress': self.student_profile['progress']
         }
     
+    @staticmethod
+    def _tool_result(future) -> Optional[Any]:
+        """Wait for a background tool call; a failing tool contributes nothing"""
+        if future is None:
+            return None
+        
+        try:
+            return future.result()
+        except Exception as e:
+            print(f"Tool error: {e}")
+            return None
+    
     def _should_search(self, user_message: str, allow_search: bool) -> bool:
         """Determine if web search is needed for current information"""
-        if not allow_search:
-            return False
-            
-        # Keywords indicating need for current information
-        current_info_keywords = [
-            'latest', 'recent', 'new', 'current', 'today',
-            'breakthrough', 'announcement', 'news', '2024', '2025'
-        ]
-        
-        message_lower = user_message.lower()
-        return any(keyword in message_lower for keyword in current_info_keywords)
+        return allow_search and _SEARCH_RE.search(user_message) is not None
     
     def _generate_response(
         self,
         user_message: str,
         context: Dict[str, Any],
-        use_search: bool
-    ) -> Dict[str, Any]:
-        """Generate response using Claude with agentic reasoning"""
+        search_results: Optional[str] = None
+    ) -> Generator[Tuple[str, None], None, Dict[str, Any]]:
+        """
+        Generate response using Claude with agentic reasoning
+        Yields (text_delta, None) as text arrives and returns the response dict
+        """
         
         # Build context-aware system prompt
         system_prompt = self._build_system_prompt(context)
@@ -169,7 +309,7 @@ class EducationalAgentOrchestrator:
         messages = []
         
         # Add conversation history
-        for msg in self.conversation_history[-5:]:  # Last 5 messages
+        for msg in self.conversation_history:
             messages.append({
                 'role': msg['role'],
                 'content': msg['content']
@@ -181,26 +321,36 @@ class EducationalAgentOrchestrator:
             'content': user_message
         })
         
-        # Perform web search if needed
-        search_results = None
-        if use_search:
-            search_results = self.web_search.search(user_message)
-            # Append search context to message
-            if search_results:
-                search_context = f"\n\n[Current Information]: {search_results}"
-                messages[-1]['content'] += search_context
-        
-        # Call Claude with extended thinking
-        response = self.client.messages.create(
-            model="claude-sonnet-4-20250514",
-            max_tokens=2000,
-            system=system_prompt,
-            messages=messages,
-            temperature=0.7
+        # Append search context to message
+        if search_results:
+            search_context = f"\n\n[Current Information]: {search_results}"
+            messages[-1]['content'] += search_context
+        
+        # Reuse a cached answer to a similar self-contained question asked at
+        # the same level; follow-ups without topic keywords depend on the
+        # conversation and are not cached
+        cacheable = (
+            self.response_cache is not None
+            and search_results is None
+            and bool(self._detect_topics(user_message))
         )
+        level = context['student_level']
+        content = self.response_cache.lookup(user_message, level) if cacheable else None
+        cache_hit = content is not None
         
-        # Extract content and detect topics
-        content = response.content[0].text
+        if cache_hit:
+            yield content, None
+        else:
+            chunks = []
+            for delta in self._stream_completion(system_prompt, messages):
+                chunks.append(delta)
+                yield delta, None
+            content = ''.join(chunks)
+            
+            if cacheable:
+                self.response_cache.store(user_message, level, content)
+        
+        # Detect topics
         detected_topics = self._detect_topics(content)
         
         # Track conversation
@@ -213,32 +363,40 @@ class EducationalAgentOrchestrator:
             'content': content
         })
         
+        tools_used = ['web_search'] if search_results else []
+        if cache_hit:
+            tools_used.append('semantic_cache')
+        
         return {
             'content': content,
-            'tools_used': ['web_search'] if search_results else [],
+            'tools_used': tools_used,
             'topics': detected_topics,
             'model': 'claude-sonnet-4'
         }
     
+    def _stream_completion(
+        self,
+        system_prompt: str,
+        messages: List[Dict[str, str]]
+    ) -> Iterator[str]:
+        """Stream response text from Claude as it is generated"""
+        with self.client.messages.stream(
+            model="claude-sonnet-4-20250514",
+            max_tokens=2000,
+            system=system_prompt,
+            messages=messages,
+            temperature=0.7
+        ) as stream:
+            yield from stream.text_stream
+    
     def _build_system_prompt(self, context: Dict[str, Any]) -> str:
         """Build context-aware system prompt"""
-        base_prompt = SYSTEM_PROMPT
-        
-        # Add student context
-        student_context = f"""
-
-Student Profile:
-- Level: {context['student_level']}
-- Progress: {context['progress']}%
-- Previously Learned Topics: {', '.join(context['learned_topics']) if context['learned_topics'] else 'None yet'}
-
-Recent Conversation Context:
-{self._format_recent_context(context['recent_conversation'])}
-
-{EDUCATIONAL_GUIDELINES}
-"""
-        
-        return base_prompt + student_context
+        return _compose_prompt(
+            context['student_level'],
+            context['progress'],
+            context['learned_topics_text'],
+            self._format_recent_context(context['recent_conversation'])
+        )
     
     def _format_recent_context(self, recent_messages: List[Dict]) -> str:
         """Format recent conversation for context"""
@@ -255,35 +413,28 @@ Recent Conversation Context:
     
     def _detect_topics(self, content: str) -> List[str]:
         """Detect AI topics mentioned in the response"""
-        topics = {
-            'Machine Learning': ['machine learning', 'ml', 'training', 'model'],
-            'Neural Networks': ['neural', 'network', 'deep learning', 'layers'],
-            'NLP': ['nlp', 'language', 'text', 'chatbot', 'sentiment'],
-            'Computer Vision': ['vision', 'image', 'detection', 'recognition'],
-            'AI Ethics': ['ethics', 'bias', 'fairness', 'responsible'],
-            'Generative AI': ['generative', 'gpt', 'llm', 'generate'],
-            'Reinforcement Learning': ['reinforcement', 'reward', 'agent', 'policy']
-        }
-        
-        content_lower = content.lower()
-        detected = []
-        
-        for topic, keywords in topics.items():
-            if any(kw in content_lower for kw in keywords):
-                detected.append(topic)
+        hits = set()
+        for match in _TOPIC_RE.finditer(content):
+            hits.add(_GROUP_TOPICS[match.lastindex])
+            
+            # Every topic already found, the rest of the text can't add any
+            if len(hits) == len(TOPIC_KEYWORDS):
+                break
         
-        return detected
+        # Preserve the topic table's ordering
+        return [topic for topic, _ in TOPIC_KEYWORDS if topic in hits]
     
     def _update_learning_graph(
         self,
         user_message: str,
-        response: Dict[str, Any]
+        response: Dict[str, Any],
+        timestamp: Optional[str] = None
     ):
         """Update long-term learning graph (Flowchart Step 4)"""
-        # Update profile with new topics
+        # Update profile with new topics; the manager owns the topic set, so
+        # other sessions for this student keep the topics they added
         new_topics = response['topics']
-        current_topics = set(self.student_profile.get('topics', []))
-        updated_topics = list(current_topics.union(set(new_topics)))
+        self.profile_manager.add_topics(new_topics)
         
         # Calculate progress increase
         if new_topics:
@@ -293,59 +444,73 @@ Recent Conversation Context:
             new_progress = self.student_profile['progress']
         
         # Determine level progression
-        new_level = self._calculate_level(new_progress, len(updated_topics))
-        
-        # Update profile
-        self.profile_manager.update_profile({
-            'topics': updated_topics,
-            'progress': new_progress,
-            'level': new_level,
-            'last_active': datetime.now().isoformat(),
+        new_level = self._calculate_level(new_progress, len(self.student_profile['topics']))
+        
+        # Persist only the fields that changed this turn
+        changes = {
+            'last_active': timestamp or fast_iso_now(),
             'total_questions': self.student_profile.get('total_questions', 0) + 1
-        })
+        }
+        if new_progress != self.student_profile['progress']:
+            changes['progress'] = new_progress
+        if new_level != self.student_profile['level']:
+            changes['level'] = new_level
         
-        # Update in-memory profile
-        self.student_profile['topics'] = updated_topics
-        self.student_profile['progress'] = new_progress
-        self.student_profile['level'] = new_level
+        # Also updates self.student_profile, which is the manager's cached dict
+        self.profile_manager.update_fields(**changes)
     
     def _calculate_level(self, progress: int, topics_count: int) -> str:
         """Calculate student level based on progress and topics"""
-        if progress < 20 or topics_count < 2:
-            return 'Beginner'
-        elif progress < 50 or topics_count < 5:
-            return 'Intermediate'
-        elif progress < 80 or topics_count < 8:
-            return 'Advanced'
-        else:
-            return 'Expert'
+        # Each threshold pair met moves the student up one level
+        return _LEVELS[
+            (progress >= 20 and topics_count >= 2)
+            + (progress >= 50 and topics_count >= 5)
+            + (progress >= 80 and topics_count >= 8)
+        ]
     
-    def _update_session(self, user_message: str, response: Dict[str, Any]):
+    def _update_session(
+        self,
+        user_message: str,
+        response: Dict[str, Any],
+        timestamp: Optional[str] = None
+    ):
         """Update session analytics"""
-        self.session_manager.add_message({
-            'role': 'user',
-            'content': user_message,
-            'timestamp': datetime.now().isoformat()
-        })
-        
-        self.session_manager.add_message({
-            'role': 'assistant',
-            'content': response['content'],
-            'timestamp': datetime.now().isoformat(),
-            'topics': response['topics']
-        })
+        timestamp = timestamp or fast_iso_now()
+        
+        self.session_manager.append_turn([
+            {
+                'role': 'user',
+                'content': user_message,
+                'timestamp': timestamp
+            },
+            {
+                'role': 'assistant',
+                'content': response['content'],
+                'timestamp': timestamp,
+                'topics': response['topics']
+            }
+        ])
+        
+        # Remember the exchange for similar future questions
+        self.memory.store_interaction(
+            query=user_message,
+            response=response['content'],
+            topics=response['topics'],
+            timestamp=timestamp
+        )
         
         # Update analytics
         self.analytics.record_interaction({
             'session_id': self.session_id,
             'topics': response['topics'],
             'tools_used': response['tools_used'],
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp
         })
     
     def _apply_teacher_override(
         self,
-        override: Dict[str, Any]
+        override: Dict[str, Any],
+        timestamp: Optional[str] = None
     ) -> Dict[str, Any]:
         """Apply teacher override for human control (Flowchart Step 3)"""
         return {
@@ -355,7 +520,7 @@ Recent Conversation Context:
             'student_level': self.student_profile['level'],
             'progress': self.student_profile['progress'],
             'session_id': self.session_id,
-            'timestamp': datetime.now().isoformat(),
+            'timestamp': timestamp or fast_iso_now(),
             'override_reason': override.get('reason', 'Teacher correction')
         }
     
@@ -365,15 +530,26 @@ Recent Conversation Context:
             'session_id': self.session_id,
             'student_id': self.student_id,
             'duration': self.session_manager.get_duration(),
-            'messages_count': len(self.conversation_history),
+            'messages_count': self.session_manager.metadata['message_count'],
             'topics_explored': list(set(self.student_profile.get('topics', []))),
             'progress': self.student_profile['progress'],
             'level': self.student_profile['level'],
             'session_data': self.session_manager.get_summary()
         }
     
+    def close(self):
+        """Write buffered profile changes and close the session's event log"""
+        with self._turn_lock:
+            self.profile_manager.flush()
+            self.session_manager.close()
+    
     def reset_session(self):
         """Start a new session while maintaining student profile"""
-        self.session_id = self._generate_session_id()
-        self.session_manager = SessionManager(self.session_id)
-        self.conversation_history = []
+        with self._turn_lock:
+            # Write buffered profile changes and events from the finished session
+            self.profile_manager.flush()
+            self.session_manager.close()
+            
+            self.session_id = self._generate_session_id()
+            self.session_manager = SessionManager(self.session_id)
+            self.conversation_history.clear()
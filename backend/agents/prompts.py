@@ -131,6 +131,24 @@ When teaching Generative AI:
 """
 }
 
+# Keywords used to detect which AI topics a response covers
+# (immutable: shared by every request at import time)
+TOPIC_KEYWORDS = (
+    ('Machine Learning', ('machine learning', 'ml', 'training', 'model')),
+    ('Neural Networks', ('neural', 'network', 'deep learning', 'layers')),
+    ('NLP', ('nlp', 'language', 'text', 'chatbot', 'sentiment')),
+    ('Computer Vision', ('vision', 'image', 'detection', 'recognition')),
+    ('AI Ethics', ('ethics', 'bias', 'fairness', 'responsible')),
+    ('Generative AI', ('generative', 'gpt', 'llm', 'generate')),
+    ('Reinforcement Learning', ('reinforcement', 'reward', 'agent', 'policy'))
+)
+
+# Keywords indicating a question needs current information (web search)
+CURRENT_INFO_KEYWORDS = (
+    'latest', 'recent', 'new', 'current', 'today', 'breakthrough',
+    'announcement', 'news', '2024', '2025'
+)
+
 RESPONSE_TEMPLATES = {
     'beginner': """
 I'll explain {topic} in a simple way!
@@ -3,11 +3,77 @@ Agent Tools for Educational AI System
 Implements web search, memory retrieval, and analytics
 """
 
-from typing import List, Dict, Any, Optional
-import requests
-from datetime import datetime
+from typing import List, Dict, Any, Optional, Tuple
+from collections import OrderedDict
+import atexit
+import httpx
+from concurrent.futures import Future, TimeoutError as FutureTimeoutError
 import json
+import os
+import re
+import threading
+import time
 from abc import ABC, abstractmethod
+import numpy as np
+from memory.cache import embed_text, tokenize, EMBEDDING_DIM
+from utils.clock import fast_iso_now
+
+
+# Simulated results for common AI queries, used when the search API is
+# unavailable
+_SIMULATED_RESULTS: Dict[str, List[Dict[str, str]]] = {
+    'machine learning': [
+        {
+            'title': 'Latest Advances in Machine Learning - 2024',
+            'snippet': 'Recent developments include improved efficiency in training large models, federated learning for privacy, and AutoML advancements.',
+            'url': 'https://ai-research.example.com/ml-2024'
+        }
+    ],
+    'neural networks': [
+        {
+            'title': 'Transformer Architecture Evolution',
+            'snippet': 'Modern neural networks have evolved beyond traditional architectures with attention mechanisms and efficient transformers.',
+            'url': 'https://ai-research.example.com/transformers'
+        }
+    ],
+    'generative ai': [
+        {
+            'title': 'Generative AI in 2024: State of the Art',
+            'snippet': 'Large language models and diffusion models continue to advance, with improved controllability and reduced computational costs.',
+            'url': 'https://ai-research.example.com/genai-2024'
+        }
+    ]
+}
+
+# Lookahead so overlapping keys are all reported in a single scan
+_SIMULATED_RE = re.compile(
+    '(?=(' + '|'.join(re.escape(key) for key in _SIMULATED_RESULTS) + '))'
+)
+_SIMULATED_RANK = {key: rank for rank, key in enumerate(_SIMULATED_RESULTS)}
+
+# Words left out of the keyword index: matching on them alone says nothing
+# about whether two interactions are related
+_STOP_WORDS = frozenset({
+    'a', 'about', 'an', 'and', 'are', 'as', 'at', 'be', 'but', 'by', 'can',
+    'could', 'did', 'do', 'does', 'for', 'from', 'has', 'have', 'how', 'i',
+    'if', 'in', 'into', 'is', 'it', 'its', 'me', 'my', 'of', 'on', 'or', 'so',
+    'than', 'that', 'the', 'their', 'them', 'then', 'there', 'these', 'they',
+    'this', 'to', 'us', 'was', 'we', 'were', 'what', 'when', 'where', 'which',
+    'who', 'why', 'will', 'with', 'would', 'you', 'your'
+})
+
+# Formatted search results shared by all students; a repeated search reuses
+# one API call for an hour. Keyed on the exact normalized query: similar
+# queries ("... in 2024" / "... in 2025") need different results
+_SEARCH_CACHE_SIZE = 512
+_SEARCH_CACHE_TTL = 3600
+_SEARCH_CACHE: OrderedDict = OrderedDict()  # key -> (expires_at, result)
+_search_cache_lock = threading.Lock()
+
+
+def _search_key(query: str, num_results: int) -> Tuple[str, int]:
+    """Query with case, spacing and closing punctuation normalized, plus result count"""
+    return ' '.join(query.lower().split()).rstrip('?!. '), num_results
 
 
 class AgentTool(ABC):
@@ -28,8 +94,38 @@ class WebSearchTool(AgentTool):
     """
     Web search tool for finding current AI information
     Uses Brave Search API (can be swapped for other providers)
+    
+    Concurrent searches for the same query share one API call, and calls
+    are paced to stay within the provider's rate limit
     """
     
+    # Brave's free tier allows about one request per second
+    MIN_INTERVAL = 1.0
+    
+    # Searches run inside an agent turn holding an LLM slot: rather than
+    # queue longer than this for the rate limit, use simulated results
+    MAX_PACING_WAIT = 3.0
+    REQUEST_TIMEOUT = 10.0
+    
+    # Longest a caller waits on an identical search already in flight
+    # (the leader's pacing wait plus its request)
+    INFLIGHT_TIMEOUT = MAX_PACING_WAIT + REQUEST_TIMEOUT
+    
+    # Class-level state shared by every search in the process: in-flight
+    # searches and rate-limit pacing
+    _inflight: Dict[Tuple[str, int], Future] = {}
+    _inflight_lock = threading.Lock()
+    _pace_lock = threading.Lock()
+    _next_request_at = 0.0
+    
+    # One keep-alive connection pool for every search, so repeated calls
+    # skip the TCP/TLS handshake
+    _client = httpx.Client(
+        timeout=REQUEST_TIMEOUT,
+        limits=httpx.Limits(max_connections=100, max_keepalive_connections=20)
+    )
+    atexit.register(_client.close)
+    
     def __init__(self, api_key: Optional[str] = None):
         self.api_key = api_key
         self.base_url = "https://api.search.brave.com/res/v1/web/search"
@@ -55,6 +151,66 @@ class WebSearchTool(AgentTool):
             # Fallback to simulated results for demo
             return self._simulate_search(query)
         
+        key = _search_key(query, num_results)
+        cached = self._cached_result(key)
+        if cached is not None:
+            return cached
+        
+        # Single-flight: join an identical search that is already running
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            is_leader = future is None
+            if is_leader:
+                future = Future()
+                self._inflight[key] = future
+        
+        if not is_leader:
+            # Raises the leader's exception; a leader that hangs is given up on
+            try:
+                return future.result(timeout=self.INFLIGHT_TIMEOUT)
+            except FutureTimeoutError:
+                return self._simulate_search(query)
+        
+        try:
+            result = self._fetch(query, num_results)
+            if result is None:
+                result = self._simulate_search(query)
+            else:
+                self._cache_result(key, result)
+        except BaseException as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+        
+        future.set_result(result)
+        return result
+    
+    @staticmethod
+    def _cached_result(key: Tuple[str, int]) -> Optional[str]:
+        """Unexpired cached result for a search key, if any"""
+        with _search_cache_lock:
+            entry = _SEARCH_CACHE.get(key)
+            if entry is None:
+                return None
+            if entry[0] <= time.monotonic():
+                del _SEARCH_CACHE[key]
+                return None
+            _SEARCH_CACHE.move_to_end(key)
+            return entry[1]
+    
+    @staticmethod
+    def _cache_result(key: Tuple[str, int], result: str):
+        """Cache a search result, dropping the least recently used when full"""
+        with _search_cache_lock:
+            _SEARCH_CACHE[key] = (time.monotonic() + _SEARCH_CACHE_TTL, result)
+            _SEARCH_CACHE.move_to_end(key)
+            if len(_SEARCH_CACHE) > _SEARCH_CACHE_SIZE:
+                _SEARCH_CACHE.popitem(last=False)
+    
+    def _fetch(self, query: str, num_results: int) -> Optional[str]:
+        """Call the search API, returning None when it fails"""
         try:
             headers = {
                 "Accept": "application/json",
@@ -66,22 +222,64 @@ class WebSearchTool(AgentTool):
                 "count": num_results
             }
             
-            response = requests.get(
+            if not self._wait_for_slot():
+                return None
+            response = self._client.get(
                 self.base_url,
                 headers=headers,
-                params=params,
-                timeout=10
+                params=params
             )
+            self._update_pacing(response.headers)
             
             if response.status_code == 200:
                 data = response.json()
                 return self._format_results(data.get('web', {}).get('results', []))
             else:
-                return self._simulate_search(query)
+                return None
                 
         except Exception as e:
             print(f"Search error: {e}")
-            return self._simulate_search(query)
+            return None
+    
+    @classmethod
+    def _wait_for_slot(cls) -> bool:
+        """
+        Block until the next outbound request is allowed
+        
+        Returns:
+            False, without waiting, if that is more than MAX_PACING_WAIT away
+        """
+        # Reserve a slot under the lock, then sleep without holding it so
+        # other searches can queue up their own slots meanwhile
+        with cls._pace_lock:
+            now = time.monotonic()
+            slot = max(now, cls._next_request_at)
+            if slot - now > cls.MAX_PACING_WAIT:
+                return False
+            cls._next_request_at = slot + cls.MIN_INTERVAL
+        
+        delay = slot - time.monotonic()
+        if delay > 0:
+            time.sleep(delay)
+        return True
+    
+    @classmethod
+    def _update_pacing(cls, headers) -> None:
+        """
+        Push back the next request when the rate limit is exhausted
+        
+        Brave reports one comma-separated value per window (per second,
+        per month); the first is the shortest window.
+        """
+        try:
+            remaining = int(headers.get('X-RateLimit-Remaining', '').split(',')[0])
+            reset = int(headers.get('X-RateLimit-Reset', '').split(',')[0])
+        except ValueError:
+            return
+        
+        if remaining <= 0:
+            with cls._pace_lock:
+                cls._next_request_at = max(cls._next_request_at, time.monotonic() + reset)
     
     def _format_results(self, results: List[Dict]) -> str:
         """Format search results for LLM consumption"""
@@ -99,35 +297,12 @@ class WebSearchTool(AgentTool):
     
     def _simulate_search(self, query: str) -> str:
         """Simulate search results when API is unavailable"""
-        # Simulated results for common AI queries
-        simulated_data = {
-            'machine learning': [
-                {
-                    'title': 'Latest Advances in Machine Learning - 2024',
-                    'snippet': 'Recent developments include improved efficiency in training large models, federated learning for privacy, and AutoML advancements.',
-                    'url': 'https://ai-research.example.com/ml-2024'
-                }
-            ],
-            'neural networks': [
-                {
-                    'title': 'Transformer Architecture Evolution',
-                    'snippet': 'Modern neural networks have evolved beyond traditional architectures with attention mechanisms and efficient transformers.',
-                    'url': 'https://ai-research.example.com/transformers'
-                }
-            ],
-            'generative ai': [
-                {
-                    'title': 'Generative AI in 2024: State of the Art',
-                    'snippet': 'Large language models and diffusion models continue to advance, with improved controllability and reduced computational costs.',
-                    'url': 'https://ai-research.example.com/genai-2024'
-                }
-            ]
-        }
-        
-        query_lower = query.lower()
-        for key, results in simulated_data.items():
-            if key in query_lower:
-                return self._format_results(results)
+        # One pass over the query finds every known key; the earliest key
+        # in the table wins, as when the table was scanned in order
+        matches = {match.group(1) for match in _SIMULATED_RE.finditer(query.lower())}
+        if matches:
+            key = min(matches, key=_SIMULATED_RANK.__getitem__)
+            return self._format_results(_SIMULATED_RESULTS[key])
         
         return "Current information: AI continues to advance rapidly in 2024-2025 with improvements in efficiency, accessibility, and capabilities across all domains."
     
@@ -157,10 +332,32 @@ class MemoryTool(AgentTool):
     Implements session memory and long-term profile storage
     """
     
+    # Candidates taken from each ranking before fusion
+    CANDIDATES = 10
+    # Minimum cosine similarity for a semantic match (distance <= 0.3)
+    MIN_SIMILARITY = 0.7
+    # Reciprocal rank fusion constant
+    RRF_K = 60
+    # BM25 parameters
+    BM25_K1 = 1.2
+    BM25_B = 0.75
+    
     def __init__(self, student_id: str):
         self.student_id = student_id
         self.memory_store = {}  # In production, use Redis/PostgreSQL
         
+        # Query embeddings of stored interactions, quantized to int8 with a
+        # per-row scale (a quarter of float32 memory); row i belongs to
+        # self._index_keys[i]. Capacity doubles as interactions are added.
+        self._vectors = np.zeros((16, EMBEDDING_DIM), dtype=np.int8)
+        self._scales = np.zeros(16, dtype=np.float32)
+        self._index_keys: List[str] = []
+        
+        # Inverted keyword index over query and response text:
+        # token -> {row: term frequency}
+        self._postings: Dict[str, Dict[int, int]] = {}
+        self._doc_lengths: List[int] = []
+        
     def execute(self, query: str, **kwargs) -> Any:
         """Execute memory retrieval"""
         return self.find_similar(query)
@@ -176,23 +373,78 @@ class MemoryTool(AgentTool):
         Returns:
             List of similar past interactions
         """
-        # In production, use vector similarity search
-        # For now, return simulated similar queries
+        count = len(self._index_keys)
+        if not count or limit <= 0:
+            return []
+        
+        # Semantic ranking: cosine similarity against every stored query,
+        # dequantized by scaling each row's dot product
+        similarities = (
+            self._vectors[:count].astype(np.float32) @ embed_text(query)
+        ) * self._scales[:count]
+        vector_ranking = [
+            i for i in self._top_k(similarities, self.CANDIDATES)
+            if similarities[i] >= self.MIN_SIMILARITY
+        ]
+        
+        # Exact-term ranking catches specific names the embedding blurs
+        keyword_scores = self._keyword_scores(query, count)
+        keyword_ranking = [
+            i for i in self._top_k(keyword_scores, self.CANDIDATES)
+            if keyword_scores[i] > 0
+        ]
+        
+        # Reciprocal rank fusion of both rankings
+        fused: Dict[int, float] = {}
+        for ranking in (vector_ranking, keyword_ranking):
+            for rank, i in enumerate(ranking, 1):
+                fused[i] = fused.get(i, 0.0) + 1.0 / (self.RRF_K + rank)
+        
+        top = sorted(fused, key=fused.get, reverse=True)[:limit]
+        
         return [
             {
-                'query': 'What is AI?',
-                'response': 'AI is intelligence demonstrated by machines...',
-                'success_rating': 0.9,
-                'timestamp': '2024-11-01T10:00:00'
+                **self.memory_store[self._index_keys[i]],
+                'similarity': float(similarities[i])
             }
+            for i in top
         ]
     
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> List[int]:
+        """Indices of the k highest scores, best first"""
+        if k < len(scores):
+            top = np.argpartition(scores, -k)[-k:]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(scores[top])[::-1]].tolist()
+    
+    def _keyword_scores(self, query: str, count: int) -> np.ndarray:
+        """BM25 score of every stored interaction for the query terms"""
+        scores = np.zeros(count, dtype=np.float32)
+        average_length = sum(self._doc_lengths) / count
+        
+        for token in set(tokenize(query)) - _STOP_WORDS:
+            postings = self._postings.get(token)
+            if not postings:
+                continue
+            
+            idf = np.log(1 + (count - len(postings) + 0.5) / (len(postings) + 0.5))
+            for row, frequency in postings.items():
+                length_norm = 1 - self.BM25_B + self.BM25_B * self._doc_lengths[row] / average_length
+                scores[row] += idf * frequency * (self.BM25_K1 + 1) / (
+                    frequency + self.BM25_K1 * length_norm
+                )
+        
+        return scores
+    
     def store_interaction(
         self,
         query: str,
         response: str,
         topics: List[str],
-        success_rating: float = 0.0
+        success_rating: float = 0.0,
+        timestamp: Optional[str] = None
     ):
         """Store successful interaction for future reference"""
         interaction = {
@@ -201,12 +453,36 @@ class MemoryTool(AgentTool):
             'response': response,
             'topics': topics,
             'success_rating': success_rating,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': timestamp or fast_iso_now()
         }
         
         # In production, store in vector database
-        key = f"interaction_{self.student_id}_{datetime.now().timestamp()}"
+        key = f"interaction_{self.student_id}_{len(self._index_keys)}"
         self.memory_store[key] = interaction
+        self._index(key, query, response)
+    
+    def _index(self, key: str, query: str, response: str):
+        """Add an interaction to the similarity and keyword indexes"""
+        count = len(self._index_keys)
+        if count == len(self._vectors):
+            grown = np.zeros((count * 2, self._vectors.shape[1]), dtype=np.int8)
+            grown[:count] = self._vectors
+            self._vectors = grown
+            self._scales = np.concatenate([self._scales, np.zeros(count, dtype=np.float32)])
+        
+        # Symmetric quantization: the largest component maps to +/-127
+        vector = embed_text(query)
+        peak = float(np.abs(vector).max())
+        scale = peak / 127 if peak else 1.0
+        self._vectors[count] = np.round(vector / scale).astype(np.int8)
+        self._scales[count] = scale
+        self._index_keys.append(key)
+        
+        tokens = [token for token in tokenize(f"{query} {response}") if token not in _STOP_WORDS]
+        for token in tokens:
+            postings = self._postings.setdefault(token, {})
+            postings[count] = postings.get(count, 0) + 1
+        self._doc_lengths.append(len(tokens))
         
     def get_student_context(self) -> Dict[str, Any]:
         """Retrieve full student context"""
@@ -239,11 +515,28 @@ class MemoryTool(AgentTool):
 class AnalyticsTool(AgentTool):
     """
     Analytics tool for tracking student progress and generating insights
+    
+    Events are stored column by column (one list per field) rather than
+    as a dict per event, so aggregations run over flat arrays.
     """
     
+    # Fields kept as columns; anything else an event carries goes to extras
+    COLUMNS = ('timestamp', 'session_id', 'topics', 'tools_used')
+    
     def __init__(self, student_id: str):
         self.student_id = student_id
-        self.analytics_store = {}
+        
+        self._timestamps: List[str] = []
+        self._session_ids: List[Optional[str]] = []
+        self._topics: List[Tuple[str, ...]] = []
+        self._tools_used: List[Tuple[str, ...]] = []
+        self._extras: List[Optional[Dict[str, Any]]] = []
+        
+        # Each event's topics as a bitmask: bit i set means the event
+        # covered self._topic_names[i]
+        self._topic_masks: List[int] = []
+        self._topic_bits: Dict[str, int] = {}
+        self._topic_names: List[str] = []
         
     def execute(self, event: Dict[str, Any]) -> None:
         """Execute analytics recording"""
@@ -256,36 +549,58 @@ class AnalyticsTool(AgentTool):
         Args:
             event: Event data including session_id, topics, tools_used, etc.
         """
-        timestamp = datetime.now().isoformat()
-        event['timestamp'] = timestamp
-        event['student_id'] = self.student_id
-        
         # In production, send to analytics pipeline
-        key = f"event_{timestamp}"
-        self.analytics_store[key] = event
+        self._timestamps.append(event.get('timestamp') or fast_iso_now())
+        self._session_ids.append(event.get('session_id'))
+        self._topics.append(tuple(event.get('topics', ())))
+        self._topic_masks.append(self._topic_mask(self._topics[-1]))
+        self._tools_used.append(tuple(event.get('tools_used', ())))
+        
+        extras = {k: v for k, v in event.items() if k not in self.COLUMNS}
+        self._extras.append(extras or None)
+    
+    def _topic_mask(self, topics: Tuple[str, ...]) -> int:
+        """Bitmask of the topics, assigning new topics the next free bit"""
+        mask = 0
+        for topic in topics:
+            bit = self._topic_bits.get(topic)
+            if bit is None:
+                bit = self._topic_bits[topic] = len(self._topic_names)
+                self._topic_names.append(topic)
+            mask |= 1 << bit
+        return mask
+    
+    @property
+    def analytics_store(self) -> Dict[str, Dict[str, Any]]:
+        """Recorded events as dicts, rebuilt from the columns"""
+        return {
+            f"event_{i}": {
+                **(self._extras[i] or {}),
+                'session_id': self._session_ids[i],
+                'topics': list(self._topics[i]),
+                'tools_used': list(self._tools_used[i]),
+                'timestamp': self._timestamps[i],
+                'student_id': self.student_id
+            }
+            for i in range(len(self._timestamps))
+        }
         
     def get_progress_summary(self) -> Dict[str, Any]:
         """Generate progress summary for student"""
-        events = list(self.analytics_store.values())
-        
-        if not events:
+        if not self._timestamps:
             return {
                 'total_interactions': 0,
                 'topics_explored': [],
                 'average_session_length': 0
             }
         
-        # Calculate metrics
-        topics = set()
-        for event in events:
-            topics.update(event.get('topics', []))
-        
+        # Every topic with a bit has appeared in at least one event
         return {
             'student_id': self.student_id,
-            'total_interactions': len(events),
-            'topics_explored': list(topics),
-            'unique_topics_count': len(topics),
-            'last_active': events[-1]['timestamp'] if events else None
+            'total_interactions': len(self._timestamps),
+            'topics_explored': list(self._topic_names),
+            'unique_topics_count': len(self._topic_names),
+            'last_active': self._timestamps[-1]
         }
     
     def generate_learning_graph(self) -> Dict[str, Any]:
@@ -295,42 +610,34 @@ class AnalyticsTool(AgentTool):
         Returns:
             Learning graph with progress over time
         """
-        events = sorted(
-            self.analytics_store.values(),
-            key=lambda x: x['timestamp']
+        # Group events by calendar day: sort once, then slice each day's run
+        days = np.array(self._timestamps, dtype='datetime64[us]').astype('datetime64[D]')
+        order = np.argsort(days, kind='stable')
+        unique_days, starts, counts = np.unique(
+            days[order], return_index=True, return_counts=True
         )
         
-        # Group by date
-        daily_progress = {}
-        for event in events:
-            date = event['timestamp'][:10]  # YYYY-MM-DD
-            if date not in daily_progress:
-                daily_progress[date] = {
-                    'interactions': 0,
-                    'topics': set()
-                }
-            
-            daily_progress[date]['interactions'] += 1
-            daily_progress[date]['topics'].update(event.get('topics', []))
-        
-        # Convert to list format
+        # Topic sets are bitmasks: union is |, cardinality is bit_count()
         graph_data = []
-        cumulative_topics = set()
+        cumulative_mask = 0
         
-        for date, data in sorted(daily_progress.items()):
-            cumulative_topics.update(data['topics'])
+        for day, start, count in zip(unique_days, starts, counts):
+            day_mask = 0
+            for i in order[start:start + count]:
+                day_mask |= self._topic_masks[i]
+            cumulative_mask |= day_mask
             graph_data.append({
-                'date': date,
-                'interactions': data['interactions'],
-                'unique_topics': len(data['topics']),
-                'cumulative_topics': len(cumulative_topics)
+                'date': str(day),
+                'interactions': int(count),
+                'unique_topics': day_mask.bit_count(),
+                'cumulative_topics': cumulative_mask.bit_count()
             })
         
         return {
             'student_id': self.student_id,
             'graph_data': graph_data,
-            'total_learning_days': len(daily_progress),
-            'total_topics_learned': len(cumulative_topics)
+            'total_learning_days': len(graph_data),
+            'total_topics_learned': cumulative_mask.bit_count()
         }
     
     def get_schema(self) -> Dict[str, Any]:
@@ -348,47 +655,51 @@ class AnalyticsTool(AgentTool):
         }
 
 
+# Curated educational content, loaded once at import
+_KNOWLEDGE_BASE: Dict[str, Dict[str, Any]] = {
+    'machine_learning_basics': {
+        'title': 'Introduction to Machine Learning',
+        'level': 'Beginner',
+        'content': 'Machine learning is a subset of AI...',
+        'examples': [
+            'Email spam detection',
+            'Product recommendations',
+            'Image recognition'
+        ],
+        'exercises': [
+            'Identify supervised vs unsupervised learning',
+            'Explain overfitting'
+        ]
+    },
+    'neural_networks': {
+        'title': 'Neural Networks Fundamentals',
+        'level': 'Intermediate',
+        'content': 'Neural networks are inspired by the brain...',
+        'examples': [
+            'Image classification with CNNs',
+            'Language translation with RNNs'
+        ],
+        'exercises': [
+            'Calculate output of a simple perceptron',
+            'Explain backpropagation'
+        ]
+    }
+}
+
+# Content indexed by (topic, level) so a lookup is one dict probe
+_KB_BY_KEY: Dict[Tuple[str, str], Dict[str, Any]] = {
+    (topic, content['level']): content
+    for topic, content in _KNOWLEDGE_BASE.items()
+}
+
+
 class KnowledgeBaseTool(AgentTool):
     """
     Knowledge base tool for retrieving curated educational content
     Connects to educational content repository
+    Stateless: every instance reads the shared module-level content
     """
     
-    def __init__(self):
-        self.knowledge_base = self._load_knowledge_base()
-        
-    def _load_knowledge_base(self) -> Dict[str, Dict[str, Any]]:
-        """Load curated educational content"""
-        return {
-            'machine_learning_basics': {
-                'title': 'Introduction to Machine Learning',
-                'level': 'Beginner',
-                'content': 'Machine learning is a subset of AI...',
-                'examples': [
-                    'Email spam detection',
-                    'Product recommendations',
-                    'Image recognition'
-                ],
-                'exercises': [
-                    'Identify supervised vs unsupervised learning',
-                    'Explain overfitting'
-                ]
-            },
-            'neural_networks': {
-                'title': 'Neural Networks Fundamentals',
-                'level': 'Intermediate',
-                'content': 'Neural networks are inspired by the brain...',
-                'examples': [
-                    'Image classification with CNNs',
-                    'Language translation with RNNs'
-                ],
-                'exercises': [
-                    'Calculate output of a simple perceptron',
-                    'Explain backpropagation'
-                ]
-            }
-        }
-    
     def execute(self, topic: str, level: str = 'Beginner') -> Optional[Dict[str, Any]]:
         """Retrieve knowledge base content for topic"""
         return self.get_content(topic, level)
@@ -408,12 +719,7 @@ class KnowledgeBaseTool(AgentTool):
         Returns:
             Educational content or None if not found
         """
-        content = self.knowledge_base.get(topic)
-        
-        if content and content['level'] == level:
-            return content
-        
-        return None
+        return _KB_BY_KEY.get((topic, level))
     
     def get_schema(self) -> Dict[str, Any]:
         """Return MCP-compatible tool schema"""
@@ -434,3 +740,9 @@ class KnowledgeBaseTool(AgentTool):
                 }
             }
         }
+
+
+# Stateless tools shared by every orchestrator; per-student state lives in
+# MemoryTool and AnalyticsTool instances
+WEB_SEARCH = WebSearchTool(api_key=os.getenv('BRAVE_SEARCH_API_KEY'))
+KB = KnowledgeBaseTool()
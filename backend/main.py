@@ -2,23 +2,30 @@
 Main FastAPI Application for Educational AI Agent
 """
 
-from fastapi import FastAPI, HTTPException, WebSocket, WebSocketDisconnect
+from fastapi import FastAPI, HTTPException, Request, Response, WebSocket, WebSocketDisconnect
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import ORJSONResponse
+from starlette.concurrency import run_in_threadpool, iterate_in_threadpool
 from pydantic import BaseModel
 from typing import Optional, List, Dict, Any
+from contextlib import asynccontextmanager
+import asyncio
+import hashlib
 import uvicorn
+import orjson
 import os
-from datetime import datetime
 
 from agents.orchestrator import EducationalAgentOrchestrator
-from memory.session import SessionManager
-from memory.profiles import StudentProfileManager
+from memory.session import SessionManager, SessionRegistry
+from memory.profiles import get_profile_manager
+from utils.clock import fast_iso_now
 
 # Initialize FastAPI app
 app = FastAPI(
     title="Educational AI Agent API",
     description="API for AI-powered educational assistance",
-    version="1.0.0"
+    version="1.0.0",
+    default_response_class=ORJSONResponse
 )
 
 # CORS middleware for frontend
@@ -30,8 +37,41 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+
+def etag_response(request: Request, content: Any) -> Response:
+    """
+    Serialize content as JSON with an ETag, answering 304 Not Modified
+    when the client already holds the same body (If-None-Match)
+    """
+    body = orjson.dumps(content)
+    etag = f'"{hashlib.blake2b(body, digest_size=16).hexdigest()}"'
+    
+    client_etags = {
+        tag.strip().removeprefix("W/")
+        for tag in request.headers.get("if-none-match", "").split(",")
+    }
+    if etag in client_etags:
+        return Response(status_code=304, headers={"ETag": etag})
+    
+    return Response(
+        content=body,
+        headers={"ETag": etag},
+        media_type="application/json"
+    )
+
 # In-memory storage for active sessions (use Redis in production)
-active_orchestrators: Dict[str, EducationalAgentOrchestrator] = {}
+# Sessions idle for an hour are closed and dropped to bound memory
+active_orchestrators = SessionRegistry(
+    idle_timeout=3600,
+    on_evict=EducationalAgentOrchestrator.close
+)
+
+# Cap on agent turns talking to Anthropic at once; further turns queue here
+# instead of piling up threads and streaming buffers
+MAX_INFLIGHT = int(os.getenv('ANTHROPIC_MAX_INFLIGHT', '32'))
+app.state.anthropic_sem = asyncio.BoundedSemaphore(MAX_INFLIGHT)
+app.state.llm_waiting = 0
+app.state.llm_inflight = 0
 
 # Request/Response Models
 class MessageRequest(BaseModel):
@@ -74,6 +114,96 @@ class TeacherOverride(BaseModel):
     topics: Optional[List[str]] = []
 
 
+class FrameBatcher:
+    """
+    Coalesces websocket frames sent in quick succession
+    Frames queued within FLUSH_INTERVAL of the first pending one (or until
+    MAX_BYTES of JSON is pending) go out as one frame:
+    {"type": "batch", "items": [...]}; a lone frame is sent as-is
+    """
+    
+    FLUSH_INTERVAL = 0.015
+    MAX_BYTES = 4096
+    
+    def __init__(self, websocket: WebSocket):
+        self.websocket = websocket
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._timer: Optional[asyncio.Task] = None
+        self._send_lock = asyncio.Lock()
+        # First error from a timed flush, re-raised to the next caller
+        self._error: Optional[Exception] = None
+    
+    async def send(self, frame: Dict[str, Any]):
+        """Queue a frame, flushing once enough data is pending"""
+        self._raise_send_error()
+        data = orjson.dumps(frame)
+        self._pending.append(data)
+        self._pending_bytes += len(data)
+        
+        if self._pending_bytes >= self.MAX_BYTES:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.create_task(self._flush_later())
+    
+    async def flush(self):
+        """Send everything pending now"""
+        self.cancel_timer()
+        self._raise_send_error()
+        
+        # The lock keeps batches in order when a timer flush and a size
+        # flush overlap
+        async with self._send_lock:
+            if not self._pending:
+                return
+            items, self._pending, self._pending_bytes = self._pending, [], 0
+            
+            if len(items) == 1:
+                payload = items[0]
+            else:
+                payload = b'{"type":"batch","items":[' + b','.join(items) + b']}'
+            # Text frames: browser clients JSON.parse the message data
+            await self.websocket.send_text(payload.decode())
+    
+    def cancel_timer(self):
+        """Stop a pending timed flush"""
+        if self._timer is not None and self._timer is not asyncio.current_task():
+            self._timer.cancel()
+        self._timer = None
+    
+    def _raise_send_error(self):
+        """Report a failed timed flush (e.g. the client disconnected)"""
+        if self._error is not None:
+            raise self._error
+    
+    async def _flush_later(self):
+        await asyncio.sleep(self.FLUSH_INTERVAL)
+        try:
+            await self.flush()
+        except Exception as e:
+            # Nobody awaits this task; keep the error for the next send or
+            # flush so the turn streaming into this socket stops
+            if self._error is None:
+                self._error = e
+
+
+@asynccontextmanager
+async def llm_slot():
+    """Hold one of the limited Anthropic call slots for an agent turn"""
+    app.state.llm_waiting += 1
+    try:
+        await app.state.anthropic_sem.acquire()
+    finally:
+        app.state.llm_waiting -= 1
+    
+    app.state.llm_inflight += 1
+    try:
+        yield
+    finally:
+        app.state.llm_inflight -= 1
+        app.state.anthropic_sem.release()
+
+
 # API Endpoints
 
 @app.get("/")
@@ -83,7 +213,7 @@ async def root():
         "status": "healthy",
         "service": "Educational AI Agent",
         "version": "1.0.0",
-        "timestamp": datetime.now().isoformat()
+        "timestamp": fast_iso_now()
     }
 
 @app.post("/api/message", response_model=MessageResponse)
@@ -100,8 +230,20 @@ async def send_message(request: MessageRequest):
     try:
         # Get or create orchestrator for this student
         orchestrator_key = f"{request.student_id}_{request.session_id or 'new'}"
+        orchestrator = active_orchestrators.get(orchestrator_key)
+        
+        # A session started without an id is registered under "<student>_new"
+        if orchestrator is None and request.session_id:
+            orchestrator = active_orchestrators.get_by_session(request.session_id)
+            
+            # Session ids are client-supplied; never serve another student's
+            if orchestrator is not None and orchestrator.student_id != request.student_id:
+                raise HTTPException(
+                    status_code=403,
+                    detail="Session belongs to another student"
+                )
         
-        if orchestrator_key not in active_orchestrators:
+        if orchestrator is None:
             # Load API key from environment
             api_key = os.getenv('ANTHROPIC_API_KEY')
             if not api_key:
@@ -115,18 +257,23 @@ async def send_message(request: MessageRequest):
                 student_id=request.student_id,
                 session_id=request.session_id
             )
-            active_orchestrators[orchestrator_key] = orchestrator
-        else:
-            orchestrator = active_orchestrators[orchestrator_key]
+            active_orchestrators.put(
+                orchestrator_key, orchestrator, orchestrator.session_id
+            )
         
-        # Process message through agent
-        response = orchestrator.process_message(
-            user_message=request.message,
-            allow_web_search=request.allow_web_search
-        )
+        # Process message through agent in the threadpool so the blocking
+        # search/LLM round-trips don't stall other students' requests
+        async with llm_slot():
+            response = await run_in_threadpool(
+                orchestrator.process_message,
+                user_message=request.message,
+                allow_web_search=request.allow_web_search
+            )
         
         return MessageResponse(**response)
         
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
@@ -136,17 +283,16 @@ async def teacher_override(override: TeacherOverride):
     Allow teacher to override AI response (Human Control - Flowchart Step 3)
     """
     try:
-        orchestrator_key = f"{override.student_id}_{override.session_id}"
+        orchestrator = active_orchestrators.get_by_session(override.session_id)
         
-        if orchestrator_key not in active_orchestrators:
+        if orchestrator is None or orchestrator.student_id != override.student_id:
             raise HTTPException(
                 status_code=404,
                 detail="Session not found"
             )
         
-        orchestrator = active_orchestrators[orchestrator_key]
-        
-        response = orchestrator.process_message(
+        response = await run_in_threadpool(
+            orchestrator.process_message,
             user_message="",
             teacher_override={
                 'message': override.message,
@@ -164,12 +310,7 @@ async def teacher_override(override: TeacherOverride):
 async def get_session_summary(session_id: str):
     """Get comprehensive session summary"""
     try:
-        # Find orchestrator with this session
-        orchestrator = None
-        for key, orch in active_orchestrators.items():
-            if orch.session_id == session_id:
-                orchestrator = orch
-                break
+        orchestrator = active_orchestrators.get_by_session(session_id)
         
         if not orchestrator:
             raise HTTPException(
@@ -184,13 +325,17 @@ async def get_session_summary(session_id: str):
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.get("/api/student/{student_id}/profile", response_model=StudentProfileResponse)
-async def get_student_profile(student_id: str):
+async def get_student_profile(student_id: str, request: Request):
     """Get student profile with learning history"""
     try:
-        profile_manager = StudentProfileManager(student_id)
-        profile = profile_manager.get_or_create_profile()
+        profile_manager = get_profile_manager(student_id)
+        # A snapshot: a live session may be updating the shared profile
+        profile = profile_manager.export_profile()
         
-        return StudentProfileResponse(**profile)
+        return etag_response(
+            request,
+            StudentProfileResponse(**profile).model_dump(mode="json")
+        )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -210,7 +355,7 @@ async def get_student_analytics(student_id: str):
             'student_id': student_id,
             'progress_summary': progress_summary,
             'learning_graph': learning_graph,
-            'timestamp': datetime.now().isoformat()
+            'timestamp': fast_iso_now()
         }
         
     except Exception as e:
@@ -221,19 +366,14 @@ async def end_session(session_id: str):
     """End session and cleanup resources"""
     try:
         # Find and remove orchestrator
-        keys_to_remove = []
-        for key, orch in active_orchestrators.items():
-            if orch.session_id == session_id:
-                summary = orch.get_session_summary()
-                keys_to_remove.append(key)
-        
-        for key in keys_to_remove:
-            del active_orchestrators[key]
+        orchestrator = active_orchestrators.pop_session(session_id)
+        if orchestrator:
+            orchestrator.close()
         
         return {
             'status': 'session_ended',
             'session_id': session_id,
-            'summary': summary if keys_to_remove else None
+            'summary': orchestrator.get_session_summary() if orchestrator else None
         }
         
     except Exception as e:
@@ -246,6 +386,7 @@ async def websocket_chat(websocket: WebSocket, student_id: str):
     Supports streaming responses and live updates
     """
     await websocket.accept()
+    frames = FrameBatcher(websocket)
     
     try:
         # Initialize orchestrator
@@ -263,20 +404,36 @@ async def websocket_chat(websocket: WebSocket, student_id: str):
             if not message:
                 continue
             
-            # Process message
-            response = orchestrator.process_message(
-                user_message=message,
-                allow_web_search=data.get('allow_web_search', True)
-            )
+            # Process message off the event loop, forwarding response text
+            # as soon as each chunk is generated
+            response = None
+            async with llm_slot():
+                turn = orchestrator.stream_message(
+                    user_message=message,
+                    allow_web_search=data.get('allow_web_search', True)
+                )
+                try:
+                    async for delta, result in iterate_in_threadpool(turn):
+                        if result is None:
+                            await frames.send({
+                                'type': 'token',
+                                'data': delta
+                            })
+                        else:
+                            response = result
+                finally:
+                    # Ends the Anthropic stream and the turn if the client
+                    # went away mid-reply
+                    await run_in_threadpool(turn.close)
             
-            # Send response
-            await websocket.send_json({
+            # Send response metadata; the text already went out as tokens
+            await frames.send({
                 'type': 'message',
-                'data': response
+                'data': {k: v for k, v in response.items() if k != 'message'}
             })
             
             # Send progress update
-            await websocket.send_json({
+            await frames.send({
                 'type': 'progress',
                 'data': {
                     'progress': response['progress'],
@@ -285,21 +442,26 @@ async def websocket_chat(websocket: WebSocket, student_id: str):
                 }
             })
             
+            # End of turn: don't hold the final frames for the timer
+            await frames.flush()
+            
     except WebSocketDisconnect:
+        frames.cancel_timer()
         print(f"WebSocket disconnected for student {student_id}")
     except Exception as e:
-        await websocket.send_json({
+        await frames.send({
             'type': 'error',
             'data': {'message': str(e)}
         })
+        await frames.flush()
         await websocket.close()
 
 # Additional utility endpoints
 
 @app.get("/api/topics")
-async def get_available_topics():
+async def get_available_topics(request: Request):
     """Get list of available AI topics"""
-    return {
+    return etag_response(request, {
         'topics': [
             {
                 'id': 'machine_learning',
@@ -338,7 +500,7 @@ async def get_available_topics():
                 'description': 'AI that creates new content'
             }
         ]
-    }
+    })
 
 @app.get("/api/health")
 async def health_check():
@@ -346,16 +508,24 @@ async def health_check():
     return {
         'status': 'healthy',
         'active_sessions': len(active_orchestrators),
-        'timestamp': datetime.now().isoformat(),
+        'llm_inflight': app.state.llm_inflight,
+        'llm_queue_depth': app.state.llm_waiting,
+        'timestamp': fast_iso_now(),
         'anthropic_configured': bool(os.getenv('ANTHROPIC_API_KEY'))
     }
 
 if __name__ == "__main__":
-    # Run the application
+    # Run the application on uvloop with the C HTTP parser. Sessions live in
+    # process memory, so more than one worker needs sticky routing per
+    # student; auto-reload is only available with a single worker.
     port = int(os.getenv('PORT', 8000))
+    workers = int(os.getenv('WEB_CONCURRENCY', 1))
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=port,
-        reload=True
+        loop="uvloop",
+        http="httptools",
+        workers=workers,
+        reload=workers == 1
     )
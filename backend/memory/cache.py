@@ -0,0 +1,235 @@
+"""
+Semantic Response Cache
+Reuses answers to near-duplicate student questions
+"""
+
+from typing import List, Optional
+from collections import OrderedDict
+import hashlib
+import re
+import threading
+import time
+import zlib
+import numpy as np
+
+
+EMBEDDING_DIM = 256
+
+_TOKEN_RE = re.compile(r'[a-z0-9]+')
+
+# Recently computed embeddings keyed by SHA-256 of the normalized text
+_EMBEDDING_CACHE_SIZE = 1024
+_embedding_cache: OrderedDict = OrderedDict()
+_embedding_lock = threading.Lock()
+
+
+def tokenize(text: str) -> List[str]:
+    """Split text into lowercase word tokens"""
+    return _TOKEN_RE.findall(text.lower())
+
+
+def embed_text(text: str, dim: int = EMBEDDING_DIM) -> np.ndarray:
+    """
+    Embed text as a normalized, hashed bag of words and word bigrams
+    
+    Lightweight stand-in for a sentence-embedding model: repeated and
+    lightly reworded questions land close together under cosine similarity
+    without loading a model.
+    
+    Args:
+        text: Text to embed
+        dim: Embedding dimension
+    
+    Returns:
+        Unit-length, read-only float32 vector (all zeros for text without words)
+    """
+    tokens = tokenize(text)
+    
+    # A turn embeds the same question several times (cache lookup/store,
+    # memory retrieval/indexing); reuse the vector for identical token lists
+    key = (hashlib.sha256(' '.join(tokens).encode()).digest(), dim)
+    with _embedding_lock:
+        vector = _embedding_cache.get(key)
+        if vector is not None:
+            _embedding_cache.move_to_end(key)
+            return vector
+    
+    features = tokens + [f"{a} {b}" for a, b in zip(tokens, tokens[1:])]
+    
+    indices = [zlib.crc32(feature.encode()) % dim for feature in features]
+    vector = np.bincount(indices, minlength=dim).astype(np.float32)
+    
+    norm = np.linalg.norm(vector)
+    if norm:
+        vector /= norm
+    vector.flags.writeable = False
+    
+    with _embedding_lock:
+        _embedding_cache[key] = vector
+        if len(_embedding_cache) > _EMBEDDING_CACHE_SIZE:
+            _embedding_cache.popitem(last=False)
+    
+    return vector
+
+
+class SemanticCache:
+    """
+    Cache of LLM responses keyed by query embedding
+    Lookup is a single matrix-vector product over all cached queries
+    In production, this would use a vector index (Redis/sqlite-vec)
+    """
+    
+    def __init__(
+        self,
+        threshold: float = 0.86,
+        max_entries: int = 1024,
+        dim: int = EMBEDDING_DIM,
+        ttl: Optional[float] = None
+    ):
+        self.threshold = threshold
+        self.max_entries = max_entries
+        self.ttl = ttl
+        
+        # Preallocated ring buffer: the oldest entry is overwritten when full
+        self._embeddings = np.zeros((max_entries, dim), dtype=np.float32)
+        self._partitions: List[Optional[str]] = [None] * max_entries
+        self._responses: List[Optional[str]] = [None] * max_entries
+        self._expires = np.full(max_entries, np.inf)
+        self._size = 0
+        self._next = 0
+        self._lock = threading.Lock()
+    
+    def lookup(self, query: str, partition: str) -> Optional[str]:
+        """
+        Find a cached response for a similar query in the same partition
+        
+        Args:
+            query: Student question
+            partition: What else the response depends on (student level,
+                prompt context, ...); only matching entries are returned
+        
+        Returns:
+            Cached response or None on a miss
+        """
+        query_vector = embed_text(query)
+        
+        with self._lock:
+            if not self._size:
+                return None
+            
+            now = time.monotonic()
+            similarities = self._embeddings[:self._size] @ query_vector
+            for index in np.argsort(similarities)[::-1]:
+                if similarities[index] < self.threshold:
+                    break
+                if self._partitions[index] == partition and self._expires[index] > now:
+                    return self._responses[index]
+        
+        return None
+    
+    def store(self, query: str, partition: str, response: str):
+        """
+        Cache a response for future similar queries
+        
+        Args:
+            query: Student question
+            partition: What else the response depends on
+            response: Generated response
+        """
+        query_vector = embed_text(query)
+        
+        with self._lock:
+            index = self._next
+            self._embeddings[index] = query_vector
+            self._partitions[index] = partition
+            self._responses[index] = response
+            if self.ttl is not None:
+                self._expires[index] = time.monotonic() + self.ttl
+            
+            self._next = (index + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
+
+
+class CentroidCache(SemanticCache):
+    """
+    Semantic cache that clusters similar queries around centroids
+    Each centroid keeps one response per partition (the most recent
+    MAX_PARTITIONS), so repeated paraphrases share a single row instead of
+    growing the cache
+    """
+    
+    MAX_PARTITIONS = 16
+    
+    def __init__(
+        self,
+        threshold: float = 0.86,
+        max_entries: int = 256,
+        dim: int = EMBEDDING_DIM
+    ):
+        super().__init__(threshold=threshold, max_entries=max_entries, dim=dim)
+        self._counts = np.zeros(max_entries, dtype=np.int64)
+    
+    def _nearest(self, query_vector: np.ndarray):
+        """Return (index, similarity) of the closest centroid, or (None, 0.0)"""
+        if not self._size:
+            return None, 0.0
+        
+        similarities = self._embeddings[:self._size] @ query_vector
+        index = int(np.argmax(similarities))
+        return index, float(similarities[index])
+    
+    def lookup(self, query: str, partition: str) -> Optional[str]:
+        """
+        Find a cached response from the closest cluster in the same partition
+        
+        Args:
+            query: Student question
+            partition: What else the response depends on
+            
+        Returns:
+            Cached response or None on a miss
+        """
+        query_vector = embed_text(query)
+        
+        with self._lock:
+            index, similarity = self._nearest(query_vector)
+            if index is None or similarity < self.threshold:
+                return None
+            return self._responses[index].get(partition)
+    
+    def store(self, query: str, partition: str, response: str):
+        """
+        Add a query to its closest cluster, or start a new cluster
+        
+        Args:
+            query: Student question
+            partition: What else the response depends on
+            response: Generated response
+        """
+        query_vector = embed_text(query)
+        
+        with self._lock:
+            index, similarity = self._nearest(query_vector)
+            
+            if index is not None and similarity >= self.threshold:
+                # Running mean of the cluster, kept at unit length
+                count = self._counts[index]
+                centroid = (self._embeddings[index] * count + query_vector) / (count + 1)
+                norm = np.linalg.norm(centroid)
+                self._embeddings[index] = centroid / norm if norm else centroid
+                self._counts[index] = count + 1
+                responses = self._responses[index]
+                responses.pop(partition, None)
+                responses[partition] = response
+                if len(responses) > self.MAX_PARTITIONS:
+                    del responses[next(iter(responses))]
+                return
+            
+            # New cluster, overwriting the oldest one when full
+            index = self._next
+            self._embeddings[index] = query_vector
+            self._counts[index] = 1
+            self._responses[index] = {partition: response}
+            
+            self._next = (index + 1) % self.max_entries
+            self._size = min(self._size + 1, self.max_entries)
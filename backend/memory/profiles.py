@@ -3,147 +3,485 @@ Student Profile Management
 Handles long-term student data and learning progress
 """
 
-from typing import Dict, Any, List, Optional
+from typing import Dict, Any, List, Optional, Tuple
 from datetime import datetime
-import json
+from functools import lru_cache
+import atexit
+import copy
+import orjson
+import sqlite3
+import threading
+import time
+import weakref
 from pathlib import Path
+from types import MappingProxyType
+from utils.clock import fast_iso_now
+
+
+# Profile fields stored as plain columns, and as JSON-encoded columns
+_SCALAR_FIELDS = (
+    'created_at', 'last_active', 'level', 'progress', 'total_questions',
+    'total_sessions', 'learning_streak_days'
+)
+_JSON_FIELDS = ('preferences', 'goals', 'weak_areas', 'strong_areas')
+
+# Fields of a new profile, copied for each student (read-only template)
+_DEFAULT_PROFILE = MappingProxyType({
+    'level': 'Beginner',
+    'progress': 0,
+    'topics': [],
+    'total_questions': 0,
+    'total_sessions': 0,
+    'learning_streak_days': 0,
+    'achievements': [],
+    'preferences': MappingProxyType({
+        'learning_pace': 'normal',
+        'preferred_examples': 'everyday',
+        'explanation_style': 'simple'
+    }),
+    'goals': [],
+    'weak_areas': [],
+    'strong_areas': []
+})
+
+# Recommendation rules: (student levels, topics already learned, topic that
+# must still be missing, recommendation). Checked in order, top 3 returned
+RECOMMENDATION_RULES = (
+    (frozenset({'Beginner'}), frozenset(), 'Machine Learning', {
+        'topic': 'Machine Learning Basics',
+        'reason': 'Great starting point for AI learning',
+        'difficulty': 'Beginner'
+    }),
+    (frozenset({'Beginner'}), frozenset(), 'AI Ethics', {
+        'topic': 'AI Ethics',
+        'reason': 'Understanding responsible AI is important',
+        'difficulty': 'Beginner'
+    }),
+    (frozenset({'Intermediate'}), frozenset({'Machine Learning'}), 'Neural Networks', {
+        'topic': 'Neural Networks',
+        'reason': 'Natural next step after Machine Learning',
+        'difficulty': 'Intermediate'
+    }),
+    (frozenset({'Intermediate'}), frozenset(), 'NLP', {
+        'topic': 'Natural Language Processing',
+        'reason': 'Exciting applications in language AI',
+        'difficulty': 'Intermediate'
+    }),
+    (frozenset({'Advanced', 'Expert'}), frozenset({'Neural Networks'}), 'Generative AI', {
+        'topic': 'Generative AI',
+        'reason': 'Cutting-edge AI technology',
+        'difficulty': 'Advanced'
+    }),
+)
+
+def _local_day(epoch_seconds: float) -> int:
+    """Days since the epoch, counted in local time"""
+    return int((epoch_seconds + time.localtime(epoch_seconds).tm_gmtoff) // 86400)
+
+
+@lru_cache(maxsize=1024)
+def _parse_timestamp(timestamp: str) -> Tuple[float, int]:
+    """(epoch seconds, local epoch day) of a stored ISO timestamp"""
+    epoch_seconds = datetime.fromisoformat(timestamp).timestamp()
+    return epoch_seconds, _local_day(epoch_seconds)
+
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS profiles (
+    student_id TEXT PRIMARY KEY,
+    created_at TEXT NOT NULL,
+    last_active TEXT NOT NULL,
+    level TEXT NOT NULL,
+    progress INTEGER NOT NULL,
+    total_questions INTEGER NOT NULL,
+    total_sessions INTEGER NOT NULL,
+    learning_streak_days INTEGER NOT NULL,
+    preferences TEXT NOT NULL,
+    goals TEXT NOT NULL,
+    weak_areas TEXT NOT NULL,
+    strong_areas TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS topics (
+    student_id TEXT NOT NULL,
+    topic TEXT NOT NULL,
+    PRIMARY KEY (student_id, topic)
+);
+CREATE TABLE IF NOT EXISTS achievements (
+    student_id TEXT NOT NULL,
+    name TEXT,
+    description TEXT,
+    earned_at TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS achievements_student ON achievements (student_id);
+"""
+
+# One connection per database file, shared by every manager and thread;
+# sqlite3 connections are not safe for concurrent use, hence the lock
+_connections: Dict[str, Tuple[sqlite3.Connection, threading.Lock]] = {}
+_connections_lock = threading.Lock()
+
+
+# Bytes of the profile database SQLite may memory-map for reads
+_MMAP_SIZE = 64 * 1024 * 1024
+
+
+def _get_connection(db_path: Path) -> Tuple[sqlite3.Connection, threading.Lock]:
+    """Open (once) the profile database at db_path"""
+    key = str(db_path.resolve())
+    with _connections_lock:
+        if key not in _connections:
+            conn = sqlite3.connect(key, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            # Read pages straight from a memory map instead of read() copies
+            conn.execute(f"PRAGMA mmap_size={_MMAP_SIZE}")
+            conn.executescript(_SCHEMA)
+            _connections[key] = (conn, threading.Lock())
+        return _connections[key]
+
+
+# Managers holding changes that haven't been written yet
+_pending_managers = weakref.WeakSet()
+
+
+@atexit.register
+def _flush_pending_managers():
+    """Write out buffered profile changes when the interpreter exits"""
+    for manager in list(_pending_managers):
+        manager.flush()
 
 
 class StudentProfileManager:
     """
     Manages persistent student profiles and learning history
+    Profiles live in a SQLite database (one row per student, with topics and
+    achievements in their own tables) so updates touch only changed rows
+    Changes are buffered in memory and written in batches (see flush)
     In production, this would use PostgreSQL or similar database
     """
     
+    # Buffered changes are written after this many updates or seconds
+    FLUSH_AFTER_UPDATES = 20
+    FLUSH_INTERVAL = 5.0
+    
     def __init__(self, student_id: str, storage_dir: str = "data/profiles"):
         self.student_id = student_id
         self.storage_dir = Path(storage_dir)
         self.storage_dir.mkdir(parents=True, exist_ok=True)
+        self.db_path = self.storage_dir / "profiles.db"
+        self._conn, self._lock = _get_connection(self.db_path)
+        
+        # Profile written by earlier versions, imported on first access
         self.profile_path = self.storage_dir / f"{student_id}.json"
         
+        # Write-back cache: the profile is loaded once, mutators edit it in
+        # memory and mark fields dirty, and flush() writes them together
+        self._profile_cache: Optional[Dict[str, Any]] = None
+        self._topic_set: set = set()  # Mirrors profile['topics'] for O(1) lookups
+        self._topics_text: Optional[str] = None  # Prompt-ready topic list
+        self._dirty: set = set()
+        self._dirty_updates = 0
+        self._flush_timer: Optional[threading.Timer] = None
+        self._cache_lock = threading.RLock()
+        
     def get_or_create_profile(self) -> Dict[str, Any]:
         """
         Get existing profile or create new one
         
+        The profile is loaded once and the same dict is returned on every
+        call, so callers see the manager's updates without re-reading it
+        
         Returns:
-            Student profile dict
+            Student profile dict (shared; change it through the mutators)
         """
-        if self.profile_path.exists():
-            return self._load_profile()
-        else:
-            return self._create_profile()
+        with self._cache_lock:
+            return self._cached_profile()
+    
+    def _cached_profile(self) -> Dict[str, Any]:
+        """The in-memory profile, loaded or created on first use"""
+        if self._profile_cache is None:
+            profile = self._load_profile()
+            self._profile_cache = profile if profile is not None else self._create_profile()
+            self._topic_set = set(self._profile_cache['topics'])
+        return self._profile_cache
+    
+    def _mark_dirty(self, *fields: str):
+        """Record changed fields and schedule them to be written"""
+        self._dirty.update(fields)
+        self._dirty_updates += 1
+        _pending_managers.add(self)
+        
+        if self._dirty_updates >= self.FLUSH_AFTER_UPDATES:
+            self.flush()
+        elif self._flush_timer is None:
+            self._flush_timer = threading.Timer(self.FLUSH_INTERVAL, self.flush)
+            self._flush_timer.daemon = True
+            self._flush_timer.start()
+    
+    def flush(self):
+        """Write every buffered change to storage in one batch"""
+        with self._cache_lock:
+            if self._flush_timer is not None:
+                self._flush_timer.cancel()
+                self._flush_timer = None
+            
+            if not self._dirty:
+                return
+            
+            changes = {
+                field: copy.deepcopy(self._profile_cache[field]) for field in self._dirty
+            }
+            # Fields stay dirty until written, so a failed write is retried
+            # by the next flush
+            self._write_fields(changes)
+            
+            self._dirty.clear()
+            self._dirty_updates = 0
+            _pending_managers.discard(self)
     
     def _create_profile(self) -> Dict[str, Any]:
         """Create new student profile with defaults"""
+        now = fast_iso_now()
         profile = {
             'student_id': self.student_id,
-            'created_at': datetime.now().isoformat(),
-            'last_active': datetime.now().isoformat(),
-            'level': 'Beginner',
-            'progress': 0,
-            'topics': [],
-            'total_questions': 0,
-            'total_sessions': 0,
-            'learning_streak_days': 0,
-            'achievements': [],
-            'preferences': {
-                'learning_pace': 'normal',
-                'preferred_examples': 'everyday',
-                'explanation_style': 'simple'
-            },
-            'goals': [],
-            'weak_areas': [],
-            'strong_areas': []
+            'created_at': now,
+            'last_active': now
         }
+        for key, value in _DEFAULT_PROFILE.items():
+            # Fresh containers per student; MappingProxyType can't be deep-copied
+            profile[key] = dict(value) if isinstance(value, MappingProxyType) else copy.copy(value)
+        
+        # Carry over a profile saved as JSON by earlier versions
+        if self.profile_path.exists():
+            try:
+                profile.update(orjson.loads(self.profile_path.read_bytes()))
+            except Exception as e:
+                print(f"Error importing profile: {e}")
         
         self._save_profile(profile)
         return profile
     
-    def _load_profile(self) -> Dict[str, Any]:
-        """Load profile from storage"""
-        try:
-            with open(self.profile_path, 'r') as f:
-                return json.load(f)
-        except Exception as e:
-            print(f"Error loading profile: {e}")
-            return self._create_profile()
+    def _load_profile(self) -> Optional[Dict[str, Any]]:
+        """Load profile from storage, or None if the student has none"""
+        with self._lock:
+            row = self._conn.execute(
+                f"SELECT {', '.join(_SCALAR_FIELDS + _JSON_FIELDS)} "
+                "FROM profiles WHERE student_id = ?",
+                (self.student_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            
+            topics = self._conn.execute(
+                "SELECT topic FROM topics WHERE student_id = ? ORDER BY rowid",
+                (self.student_id,)
+            ).fetchall()
+            achievements = self._conn.execute(
+                "SELECT name, description, earned_at FROM achievements "
+                "WHERE student_id = ? ORDER BY rowid",
+                (self.student_id,)
+            ).fetchall()
+        
+        profile = {'student_id': self.student_id}
+        profile.update(zip(_SCALAR_FIELDS, row))
+        profile.update(
+            (field, orjson.loads(value))
+            for field, value in zip(_JSON_FIELDS, row[len(_SCALAR_FIELDS):])
+        )
+        profile['topics'] = [topic for topic, in topics]
+        profile['achievements'] = [
+            {'name': name, 'description': description, 'earned_at': earned_at}
+            for name, description, earned_at in achievements
+        ]
+        return profile
     
     def _save_profile(self, profile: Dict[str, Any]):
-        """Save profile to storage"""
-        try:
-            with open(self.profile_path, 'w') as f:
-                json.dump(profile, f, indent=2)
-        except Exception as e:
-            print(f"Error saving profile: {e}")
+        """Save the full profile to storage"""
+        self._write_fields({
+            key: value for key, value in profile.items() if key != 'student_id'
+        })
     
-    def update_profile(self, updates: Dict[str, Any]):
+    def _write_fields(self, changes: Dict[str, Any]):
         """
-        Update profile with new data
+        Write the given profile fields, inserting the profile row if needed
+        
+        All statements run in one transaction, so a crash part-way through
+        leaves the previous profile intact rather than a partial write
         
         Args:
-            updates: Dict of fields to update
+            changes: Field values; topics and achievements replace the
+                student's rows in their tables
         """
-        profile = self.get_or_create_profile()
+        columns = [f for f in _SCALAR_FIELDS if f in changes]
+        json_columns = [f for f in _JSON_FIELDS if f in changes]
+        values = [changes[f] for f in columns] + [orjson.dumps(changes[f]).decode() for f in json_columns]
         
-        # Update fields
-        for key, value in updates.items():
-            if key in profile:
-                profile[key] = value
+        with self._lock:
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                if columns or json_columns:
+                    assignments = ', '.join(f"{c} = ?" for c in columns + json_columns)
+                    cursor = self._conn.execute(
+                        f"UPDATE profiles SET {assignments} WHERE student_id = ?",
+                        values + [self.student_id]
+                    )
+                    if cursor.rowcount == 0:
+                        self._conn.execute(
+                            f"INSERT INTO profiles (student_id, {', '.join(columns + json_columns)}) "
+                            f"VALUES ({', '.join('?' * (len(values) + 1))})",
+                            [self.student_id] + values
+                        )
+            
+                if 'topics' in changes:
+                    self._conn.execute(
+                        "DELETE FROM topics WHERE student_id = ?", (self.student_id,)
+                    )
+                    self._conn.executemany(
+                        "INSERT OR IGNORE INTO topics (student_id, topic) VALUES (?, ?)",
+                        [(self.student_id, topic) for topic in changes['topics']]
+                    )
+            
+                if 'achievements' in changes:
+                    self._conn.execute(
+                        "DELETE FROM achievements WHERE student_id = ?", (self.student_id,)
+                    )
+                    self._conn.executemany(
+                        "INSERT INTO achievements (student_id, name, description, earned_at) "
+                        "VALUES (?, ?, ?, ?)",
+                        [
+                            (self.student_id, a.get('name'), a.get('description'), a['earned_at'])
+                            for a in changes['achievements']
+                        ]
+                    )
+    
+            except BaseException:
+                self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+    
+    def update_profile(self, updates: Dict[str, Any], timestamp: Optional[str] = None):
+        """
+        Update profile with new data
         
-        # Update last active time
-        profile['last_active'] = datetime.now().isoformat()
+        Args:
+            updates: Dict of fields to update
+            timestamp: Time of the change (defaults to now)
+        """
+        with self._cache_lock:
+            profile = self._cached_profile()
+            
+            # Update fields
+            updated = [key for key in updates if key in profile]
+            for key in updated:
+                profile[key] = updates[key]
+            if 'topics' in updates:
+                self._topic_set = set(profile['topics'])
+                self._topics_text = None
+            
+            # Update last active time
+            profile['last_active'] = timestamp or fast_iso_now()
+            
+            self._mark_dirty('last_active', *updated)
+    
+    def update_fields(self, **changes: Any):
+        """
+        Persist only the fields whose values actually changed
         
-        # Save updated profile
-        self._save_profile(profile)
+        Args:
+            **changes: Field values to update
+        """
+        with self._cache_lock:
+            profile = self._cached_profile()
+            
+            changed = {
+                key: value for key, value in changes.items()
+                if key in profile and profile[key] != value
+            }
+            
+            # Skip the write entirely when nothing changed
+            if not changed:
+                return
+            
+            profile.update(changed)
+            if 'topics' in changed:
+                self._topic_set = set(profile['topics'])
+                self._topics_text = None
+            self._mark_dirty(*changed)
     
     def add_topic(self, topic: str):
         """Add newly learned topic"""
-        profile = self.get_or_create_profile()
+        self.add_topics([topic])
+    
+    def add_topics(self, topics: List[str]) -> bool:
+        """
+        Add newly learned topics, skipping ones already in the profile
         
-        if topic not in profile['topics']:
-            profile['topics'].append(topic)
-            self._save_profile(profile)
+        Returns:
+            Whether any topic was new
+        """
+        with self._cache_lock:
+            profile = self._cached_profile()
+            
+            new_topics = [topic for topic in dict.fromkeys(topics) if topic not in self._topic_set]
+            if not new_topics:
+                return False
+            
+            self._topic_set.update(new_topics)
+            profile['topics'].extend(new_topics)
+            self._topics_text = None
+            self._mark_dirty('topics')
+            return True
+    
+    def get_topics_text(self) -> str:
+        """Learned topics as one comma-separated string, rebuilt only when they change"""
+        with self._cache_lock:
+            if self._topics_text is None:
+                self._topics_text = ', '.join(self._cached_profile()['topics'])
+            return self._topics_text
     
     def increment_progress(self, amount: int = 5):
         """Increment learning progress"""
-        profile = self.get_or_create_profile()
-        profile['progress'] = min(100, profile['progress'] + amount)
-        self._save_profile(profile)
+        with self._cache_lock:
+            profile = self._cached_profile()
+            profile['progress'] = min(100, profile['progress'] + amount)
+            self._mark_dirty('progress')
     
-    def add_achievement(self, achievement: Dict[str, Any]):
+    def add_achievement(self, achievement: Dict[str, Any], timestamp: Optional[str] = None):
         """
         Add learning achievement
         
         Args:
             achievement: Dict with name, description, earned_at
+            timestamp: Time earned (defaults to now)
         """
-        profile = self.get_or_create_profile()
-        
-        achievement['earned_at'] = datetime.now().isoformat()
-        profile['achievements'].append(achievement)
-        
-        self._save_profile(profile)
+        with self._cache_lock:
+            profile = self._cached_profile()
+            
+            achievement['earned_at'] = timestamp or fast_iso_now()
+            profile['achievements'].append(achievement)
+            
+            self._mark_dirty('achievements')
     
     def update_learning_streak(self):
         """Update learning streak (consecutive days of activity)"""
-        profile = self.get_or_create_profile()
-        
-        last_active = datetime.fromisoformat(profile['last_active'])
-        today = datetime.now().date()
-        last_date = last_active.date()
-        
-        # Check if consecutive day
-        days_diff = (today - last_date).days
-        
-        if days_diff == 1:
-            # Consecutive day
-            profile['learning_streak_days'] += 1
-        elif days_diff > 1:
-            # Streak broken
-            profile['learning_streak_days'] = 1
-        # If same day, no change
-        
-        self._save_profile(profile)
+        with self._cache_lock:
+            profile = self._cached_profile()
+            
+            # Check if consecutive day
+            _, last_day = _parse_timestamp(profile['last_active'])
+            days_diff = _local_day(time.time()) - last_day
+            
+            if days_diff == 1:
+                # Consecutive day
+                profile['learning_streak_days'] += 1
+            elif days_diff > 1:
+                # Streak broken
+                profile['learning_streak_days'] = 1
+            else:
+                # Same day, no change
+                return
+            
+            self._mark_dirty('learning_streak_days')
     
     def get_learning_history(self) -> Dict[str, Any]:
         """
@@ -171,9 +509,8 @@ class StudentProfileManager:
     
     def _days_since_created(self, created_at: str) -> int:
         """Calculate days since profile creation"""
-        created = datetime.fromisoformat(created_at)
-        now = datetime.now()
-        return (now - created).days
+        created, _ = _parse_timestamp(created_at)
+        return int((time.time() - created) // 86400)
     
     def get_recommendations(self) -> List[Dict[str, str]]:
         """
@@ -182,50 +519,18 @@ class StudentProfileManager:
         Returns:
             List of recommended topics/activities
         """
-        profile = self.get_or_create_profile()
-        learned_topics = set(profile['topics'])
-        
-        # Topic prerequisites and recommendations
-        recommendations = []
-        
-        # Beginner recommendations
-        if profile['level'] == 'Beginner':
-            if 'Machine Learning' not in learned_topics:
-                recommendations.append({
-                    'topic': 'Machine Learning Basics',
-                    'reason': 'Great starting point for AI learning',
-                    'difficulty': 'Beginner'
-                })
-            if 'AI Ethics' not in learned_topics:
-                recommendations.append({
-                    'topic': 'AI Ethics',
-                    'reason': 'Understanding responsible AI is important',
-                    'difficulty': 'Beginner'
-                })
-        
-        # Intermediate recommendations
-        elif profile['level'] == 'Intermediate':
-            if 'Machine Learning' in learned_topics and 'Neural Networks' not in learned_topics:
-                recommendations.append({
-                    'topic': 'Neural Networks',
-                    'reason': 'Natural next step after Machine Learning',
-                    'difficulty': 'Intermediate'
-                })
-            if 'NLP' not in learned_topics:
-                recommendations.append({
-                    'topic': 'Natural Language Processing',
-                    'reason': 'Exciting applications in language AI',
-                    'difficulty': 'Intermediate'
-                })
-        
-        # Advanced recommendations
-        else:
-            if 'Neural Networks' in learned_topics and 'Generative AI' not in learned_topics:
-                recommendations.append({
-                    'topic': 'Generative AI',
-                    'reason': 'Cutting-edge AI technology',
-                    'difficulty': 'Advanced'
-                })
+        with self._cache_lock:
+            level = self._cached_profile()['level']
+            learned_topics = self._topic_set
+            
+            # Copies: the rule payloads are shared by every student
+            recommendations = [
+                dict(recommendation)
+                for levels, prerequisites, missing, recommendation in RECOMMENDATION_RULES
+                if level in levels
+                and missing not in learned_topics
+                and prerequisites <= learned_topics
+            ]
         
         return recommendations[:3]  # Return top 3 recommendations
     
@@ -236,4 +541,32 @@ class StudentProfileManager:
         Returns:
             Complete profile data
         """
-        return self.get_or_create_profile()
+        with self._cache_lock:
+            return copy.deepcopy(self._cached_profile())
+
+
+# Live managers by (database directory, student). Everyone working on a
+# student shares one write-back cache, so a profile read from another
+# request sees changes that haven't been flushed yet
+_shared_managers = weakref.WeakValueDictionary()
+_shared_managers_lock = threading.Lock()
+
+
+def get_profile_manager(student_id: str, storage_dir: str = "data/profiles") -> StudentProfileManager:
+    """
+    Get the live profile manager for a student, creating it if needed
+    
+    Args:
+        student_id: Student whose profile to manage
+        storage_dir: Directory holding the profile database
+        
+    Returns:
+        Manager shared by every current user of this student's profile
+    """
+    key = (str(Path(storage_dir).resolve()), student_id)
+    with _shared_managers_lock:
+        manager = _shared_managers.get(key)
+        if manager is None:
+            manager = StudentProfileManager(student_id, storage_dir)
+            _shared_managers[key] = manager
+        return manager
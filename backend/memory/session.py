@@ -3,9 +3,54 @@ Session Memory Management
 Handles short-term context and conversation history
 """
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Callable, Optional
 from datetime import datetime, timedelta
-from collections import deque
+from collections import Counter, deque, OrderedDict
+from functools import lru_cache
+from itertools import islice
+from pathlib import Path
+import hashlib
+import orjson
+import re
+import threading
+import time
+from utils.clock import fast_iso_now
+
+
+# Characters allowed in event log file names; anything else is replaced
+_UNSAFE_NAME_RE = re.compile(r'[^A-Za-z0-9_-]')
+
+
+def _log_name(session_id: str) -> str:
+    """
+    File name for a session's event log
+    
+    Session ids come from clients, so characters outside [A-Za-z0-9_-] are
+    replaced and a hash of the original id keeps distinct ids apart
+    """
+    safe = _UNSAFE_NAME_RE.sub('_', session_id)
+    if safe != session_id or not safe:
+        safe += '_' + hashlib.blake2b(session_id.encode(), digest_size=8).hexdigest()
+    return f"{safe}.jsonl"
+
+
+@lru_cache(maxsize=64)
+def _topics_pattern(topics: tuple) -> re.Pattern:
+    """Caseless regex matching any of the topics as a substring"""
+    return re.compile('|'.join(map(re.escape, topics)), re.IGNORECASE)
+
+
+@lru_cache(maxsize=256)
+def _format_seconds(seconds: int) -> str:
+    """Human-readable duration for a whole number of seconds"""
+    if seconds < 60:
+        return f"{seconds} seconds"
+    
+    hours, remainder = divmod(seconds, 3600)
+    minutes = remainder // 60
+    if not hours:
+        return f"{minutes} minute{'s' if minutes > 1 else ''}"
+    return f"{hours}h {minutes}m"
 
 
 class SessionManager:
@@ -14,19 +59,38 @@ class SessionManager:
     In production, this would use Redis for distributed sessions
     """
     
-    def __init__(self, session_id: str, max_history: int = 50):
+    # Write buffer for the session's event log
+    EVENTS_BUFFER_SIZE = 64 * 1024
+    
+    def __init__(
+        self,
+        session_id: str,
+        max_history: int = 50,
+        storage_dir: str = "data/sessions"
+    ):
         self.session_id = session_id
         self.max_history = max_history
         self.start_time = datetime.now()
         
         # Session data structures
         self.messages = deque(maxlen=max_history)
-        self.events = []
+        self._role_counts = Counter()  # Roles of the messages currently held
+        
+        # Events are appended to a JSONL file (opened on the first event)
+        # rather than held in memory; only the count is kept
+        storage_path = Path(storage_dir).resolve()
+        self.events_path = (storage_path / _log_name(session_id)).resolve()
+        if self.events_path.parent != storage_path:
+            raise ValueError(f"Invalid session id: {session_id!r}")
+        self._events_file = None
+        self._events_offset = 0  # Where this manager's events start in the log
+        self._events_count = 0
         self.metadata = {
             'session_id': session_id,
             'start_time': self.start_time.isoformat(),
             'message_count': 0,
-            'topics_discussed': set()
+            # Insertion-ordered set of topics (dict keys, values unused)
+            'topics_discussed': {}
         }
         
     def add_message(self, message: Dict[str, Any]):
@@ -36,12 +100,43 @@ class SessionManager:
         Args:
             message: Message dict with role, content, timestamp
         """
+        self._count_role(message)
         self.messages.append(message)
         self.metadata['message_count'] += 1
         
         # Track topics if present
         if 'topics' in message:
-            self.metadata['topics_discussed'].update(message['topics'])
+            self._track_topics(message['topics'])
+    
+    def _count_role(self, message: Dict[str, Any]):
+        """Update role counts for a message about to be appended"""
+        if len(self.messages) == self.max_history:
+            # The deque drops its oldest message to make room
+            self._role_counts[self.messages[0].get('role')] -= 1
+        self._role_counts[message.get('role')] += 1
+    
+    def append_turn(self, messages: List[Dict[str, Any]]):
+        """
+        Add all messages from one conversational turn in a single update
+        
+        Args:
+            messages: Message dicts for the turn (user question, AI reply)
+        """
+        self.metadata['message_count'] += len(messages)
+        
+        for message in messages:
+            self._count_role(message)
+            self.messages.append(message)
+            if 'topics' in message:
+                self._track_topics(message['topics'])
+    
+    def _track_topics(self, topics: List[str]):
+        """Record discussed topics, keeping first-mention order"""
+        self.metadata['topics_discussed'].update(dict.fromkeys(topics))
+    
+    def get_topics_discussed(self) -> List[str]:
+        """Topics discussed this session, in the order first mentioned (a new list)"""
+        return list(self.metadata['topics_discussed'])
     
     def add_event(self, event: Dict[str, Any]):
         """
@@ -50,9 +145,37 @@ class SessionManager:
         Args:
             event: Event data (user action, system state change, etc.)
         """
-        event['event_id'] = f"{self.session_id}_{len(self.events)}"
-        event['timestamp'] = event.get('timestamp', datetime.now().isoformat())
-        self.events.append(event)
+        event['event_id'] = f"{self.session_id}_{self._events_count}"
+        event['timestamp'] = event.get('timestamp', fast_iso_now())
+        
+        if self._events_file is None:
+            # Always append: a log left by an earlier manager with the same
+            # session id (ids have one-second resolution) is kept
+            self.events_path.parent.mkdir(parents=True, exist_ok=True)
+            self._events_file = open(self.events_path, 'ab', buffering=self.EVENTS_BUFFER_SIZE)
+            self._events_offset = self._events_file.tell()
+        elif self._events_file.closed:
+            self._events_file = open(self.events_path, 'ab', buffering=self.EVENTS_BUFFER_SIZE)
+        
+        self._events_file.write(orjson.dumps(event) + b"\n")
+        self._events_count += 1
+    
+    @property
+    def events(self) -> List[Dict[str, Any]]:
+        """Events recorded this session, read back from the event log"""
+        if self._events_file is None:
+            return []
+        
+        if not self._events_file.closed:
+            self._events_file.flush()
+        with open(self.events_path, 'rb') as events_file:
+            events_file.seek(self._events_offset)
+            return [orjson.loads(line) for line in events_file]
+    
+    def close(self):
+        """Flush and close the event log"""
+        if self._events_file is not None:
+            self._events_file.close()
     
     def get_recent_messages(self, limit: int = 10) -> List[Dict[str, Any]]:
         """
@@ -64,8 +187,9 @@ class SessionManager:
         Returns:
             List of recent messages
         """
-        messages_list = list(self.messages)
-        return messages_list[-limit:] if messages_list else []
+        recent = list(islice(reversed(self.messages), limit))
+        recent.reverse()
+        return recent
     
     def get_message_history(self) -> List[Dict[str, Any]]:
         """Get complete message history"""
@@ -84,23 +208,18 @@ class SessionManager:
             Dict with session statistics
         """
         duration = self.get_duration()
-        messages = list(self.messages)
-        
-        # Calculate metrics
-        user_messages = [m for m in messages if m.get('role') == 'user']
-        ai_messages = [m for m in messages if m.get('role') == 'assistant']
         
         return {
             'session_id': self.session_id,
             'duration_seconds': duration,
             'duration_formatted': self._format_duration(duration),
-            'total_messages': len(messages),
-            'user_messages': len(user_messages),
-            'ai_responses': len(ai_messages),
-            'topics_discussed': list(self.metadata['topics_discussed']),
+            'total_messages': len(self.messages),
+            'user_messages': self._role_counts['user'],
+            'ai_responses': self._role_counts['assistant'],
+            'topics_discussed': self.get_topics_discussed(),
             'start_time': self.metadata['start_time'],
-            'end_time': datetime.now().isoformat(),
-            'events_count': len(self.events)
+            'end_time': fast_iso_now(),
+            'events_count': self._events_count
         }
     
     def get_context_summary(self) -> str:
@@ -108,14 +227,13 @@ class SessionManager:
         Get textual summary of session context
         Useful for providing context to the LLM
         """
-        messages = list(self.messages)
-        if not messages:
+        if not self.messages:
             return "New session, no previous context."
         
-        recent = messages[-5:]
+        recent = self.get_recent_messages(limit=5)
         summary_parts = [
             f"Session Duration: {self._format_duration(self.get_duration())}",
-            f"Messages Exchanged: {len(messages)}",
+            f"Messages Exchanged: {len(self.messages)}",
             f"Topics Discussed: {', '.join(self.metadata['topics_discussed']) if self.metadata['topics_discussed'] else 'None yet'}",
             "\nRecent Conversation:"
         ]
@@ -129,19 +247,12 @@ class SessionManager:
     
     def _format_duration(self, seconds: float) -> str:
         """Format duration in human-readable format"""
-        if seconds < 60:
-            return f"{int(seconds)} seconds"
-        elif seconds < 3600:
-            minutes = int(seconds / 60)
-            return f"{minutes} minute{'s' if minutes > 1 else ''}"
-        else:
-            hours = int(seconds / 3600)
-            minutes = int((seconds % 3600) / 60)
-            return f"{hours}h {minutes}m"
+        return _format_seconds(int(seconds))
     
     def clear_history(self):
         """Clear message history (keeping metadata)"""
         self.messages.clear()
+        self._role_counts.clear()
         self.metadata['message_count'] = 0
     
     def export_session(self) -> Dict[str, Any]:
@@ -155,12 +266,21 @@ class SessionManager:
             'session_id': self.session_id,
             'metadata': {
                 **self.metadata,
-                'topics_discussed': list(self.metadata['topics_discussed'])
+                'topics_discussed': self.get_topics_discussed()
             },
             'messages': list(self.messages),
             'events': self.events,
             'summary': self.get_summary()
         }
+    
+    def export_bytes(self) -> bytes:
+        """
+        Export complete session data as UTF-8 JSON
+        
+        Returns:
+            Serialized export_session() data
+        """
+        return orjson.dumps(self.export_session())
 
 
 class ContextWindow:
@@ -193,26 +313,24 @@ class ContextWindow:
         def estimate_tokens(text: str) -> int:
             return len(text) // 4
         
-        formatted_messages = []
         current_tokens = estimate_tokens(system_prompt)
         
         if additional_context:
             current_tokens += estimate_tokens(additional_context)
         
-        # Add messages from most recent backwards
+        # Count messages from most recent backwards, stopping at the first
+        # that doesn't fit; only the kept run is ever examined
+        keep = 0
         for msg in reversed(messages):
-            msg_tokens = estimate_tokens(msg.get('content', ''))
-            
-            if current_tokens + msg_tokens > self.max_tokens:
+            current_tokens += estimate_tokens(msg.get('content', ''))
+            if current_tokens > self.max_tokens:
                 break
-            
-            formatted_messages.insert(0, {
-                'role': msg['role'],
-                'content': msg['content']
-            })
-            current_tokens += msg_tokens
+            keep += 1
         
-        return formatted_messages
+        return [
+            {'role': msg['role'], 'content': msg['content']}
+            for msg in messages[len(messages) - keep:]
+        ]
     
     def prioritize_context(
         self,
@@ -232,10 +350,125 @@ class ContextWindow:
         
         # Find messages related to important topics
         relevant = []
-        for msg in messages[:-recent_count]:
-            content_lower = msg.get('content', '').lower()
-            if any(topic.lower() in content_lower for topic in important_topics):
-                relevant.append(msg)
+        if important_topics:
+            pattern = _topics_pattern(tuple(important_topics))
+            relevant = [
+                msg for msg in messages[:-recent_count]
+                if pattern.search(msg.get('content', ''))
+            ]
         
         # Combine and return
         return relevant + recent
+
+
+class SessionRegistry:
+    """
+    Registry of live per-session objects (agent orchestrators)
+    Indexed by key and by session id; idle entries are evicted
+    In production, this would be backed by Redis
+    """
+    
+    def __init__(
+        self,
+        idle_timeout: float = 3600,
+        on_evict: Optional[Callable[[Any], None]] = None
+    ):
+        self.idle_timeout = idle_timeout
+        # Teardown for entries the registry drops itself (idle or replaced);
+        # called outside the registry lock
+        self.on_evict = on_evict
+        
+        # key -> [value, session_id, last_used], least recently used first
+        self._entries: OrderedDict = OrderedDict()
+        self._keys_by_session: Dict[str, str] = {}
+        self._lock = threading.Lock()
+    
+    def get(self, key: str) -> Optional[Any]:
+        """Get the entry for a key, marking it as recently used"""
+        with self._lock:
+            now = time.monotonic()
+            evicted = self._evict_idle(now)
+            value = self._touch(key, now)
+        self._release(evicted)
+        return value
+    
+    def get_by_session(self, session_id: str) -> Optional[Any]:
+        """Get the entry registered for a session id"""
+        with self._lock:
+            now = time.monotonic()
+            evicted = self._evict_idle(now)
+            key = self._keys_by_session.get(session_id)
+            value = self._touch(key, now) if key is not None else None
+        self._release(evicted)
+        return value
+    
+    def put(self, key: str, value: Any, session_id: str):
+        """
+        Register an entry under its key and session id
+        
+        Args:
+            key: Lookup key (student and requested session)
+            value: Object to keep alive
+            session_id: Session the object serves
+        """
+        with self._lock:
+            now = time.monotonic()
+            evicted = self._evict_idle(now)
+            
+            # A reused key (e.g. "<student>_new") replaces its old session,
+            # which must no longer resolve to the new entry
+            previous = self._entries.get(key)
+            if previous is not None:
+                if self._keys_by_session.get(previous[1]) == key:
+                    del self._keys_by_session[previous[1]]
+                if previous[0] is not value:
+                    evicted.append(previous[0])
+            
+            self._entries[key] = [value, session_id, now]
+            self._entries.move_to_end(key)
+            self._keys_by_session[session_id] = key
+        self._release(evicted)
+    
+    def pop_session(self, session_id: str) -> Optional[Any]:
+        """Remove and return the entry registered for a session id"""
+        with self._lock:
+            key = self._keys_by_session.pop(session_id, None)
+            if key is None:
+                return None
+            return self._entries.pop(key)[0]
+    
+    def __len__(self) -> int:
+        with self._lock:
+            evicted = self._evict_idle(time.monotonic())
+            count = len(self._entries)
+        self._release(evicted)
+        return count
+    
+    def _touch(self, key: str, now: float) -> Optional[Any]:
+        """Refresh an entry's idle timer and return its value"""
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        entry[2] = now
+        self._entries.move_to_end(key)
+        return entry[0]
+    
+    def _evict_idle(self, now: float) -> List[Any]:
+        """Drop entries unused for longer than the idle timeout, returning them"""
+        evicted = []
+        cutoff = now - self.idle_timeout
+        while self._entries:
+            key, (value, session_id, last_used) = next(iter(self._entries.items()))
+            if last_used >= cutoff:
+                break
+            del self._entries[key]
+            if self._keys_by_session.get(session_id) == key:
+                del self._keys_by_session[session_id]
+            evicted.append(value)
+        return evicted
+    
+    def _release(self, evicted: List[Any]):
+        """Hand dropped entries to the eviction callback"""
+        if self.on_evict is not None:
+            for value in evicted:
+                self.on_evict(value)
@@ -3,11 +3,14 @@ Tests for Agent Orchestrator
 """
 
 import pytest
+from functools import partial
 from unittest.mock import Mock, patch, MagicMock
-from datetime import datetime
 
-from agents.orchestrator import EducationalAgentOrchestrator
-from agents.tools import WebSearchTool, MemoryTool, AnalyticsTool
+from agents.orchestrator import EducationalAgentOrchestrator, _get_client
+from agents.tools import WebSearchTool, MemoryTool, AnalyticsTool, KnowledgeBaseTool
+from memory.cache import CentroidCache
+from memory.profiles import get_profile_manager
+from memory.session import SessionManager
 
 
 class TestEducationalAgentOrchestrator:
@@ -16,17 +19,26 @@ class TestEducationalAgentOrchestrator:
     @pytest.fixture
     def mock_anthropic_client(self):
         """Mock Anthropic client"""
-        with patch('agents.orchestrator.anthropic.Anthropic') as mock:
-            client = Mock()
-            response = Mock()
-            response.content = [Mock(text="Machine learning is a subset of AI...")]
-            client.messages.create.return_value = response
+        with patch('anthropic.Anthropic') as mock:
+            client = MagicMock()
+            stream = client.messages.stream.return_value.__enter__.return_value
+            stream.text_stream = ["Machine learning ", "is a subset of AI..."]
             mock.return_value = client
+            _get_client.cache_clear()
             yield mock
+        _get_client.cache_clear()
     
     @pytest.fixture
-    def orchestrator(self, mock_anthropic_client):
-        """Create orchestrator instance for testing"""
+    def orchestrator(self, mock_anthropic_client, tmp_path, monkeypatch):
+        """Create orchestrator instance for testing, storing its data in a temp dir"""
+        monkeypatch.setattr(
+            'agents.orchestrator.get_profile_manager',
+            partial(get_profile_manager, storage_dir=str(tmp_path / "profiles"))
+        )
+        monkeypatch.setattr(
+            'agents.orchestrator.SessionManager',
+            partial(SessionManager, storage_dir=str(tmp_path / "sessions"))
+        )
         return EducationalAgentOrchestrator(
             anthropic_api_key="test_key",
             student_id="test_student_123"
@@ -41,6 +53,27 @@ class TestEducationalAgentOrchestrator:
         assert isinstance(orchestrator.analytics, AnalyticsTool)
         assert len(orchestrator.conversation_history) == 0
     
+    def test_client_shared_across_orchestrators(self, orchestrator, mock_anthropic_client):
+        """Test orchestrators with the same API key share one client"""
+        other = EducationalAgentOrchestrator(
+            anthropic_api_key="test_key",
+            student_id="another_student"
+        )
+        
+        assert other.client is orchestrator.client
+        assert mock_anthropic_client.call_count == 1
+    
+    def test_stateless_tools_shared_across_orchestrators(self, orchestrator):
+        """Test web search and knowledge base tools are process-wide singletons"""
+        other = EducationalAgentOrchestrator(
+            anthropic_api_key="test_key",
+            student_id="another_student"
+        )
+        
+        assert other.web_search is orchestrator.web_search
+        assert other.knowledge_base is orchestrator.knowledge_base
+        assert other.memory is not orchestrator.memory
+    
     def test_session_id_generation(self, orchestrator):
         """Test session ID is generated correctly"""
         session_id = orchestrator.session_id
@@ -77,6 +110,11 @@ class TestEducationalAgentOrchestrator:
         """Test search is disabled when flag is False"""
         assert not orchestrator._should_search("Latest AI news", False)
     
+    def test_should_search_matches_whole_words(self, orchestrator):
+        """Test search keywords only match whole words"""
+        assert orchestrator._should_search("Any NEW announcements about GPT?", True)
+        assert not orchestrator._should_search("I knew it was currently renewing", True)
+    
     def test_detect_topics(self, orchestrator):
         """Test topic detection in responses"""
         content = """
@@ -90,6 +128,31 @@ class TestEducationalAgentOrchestrator:
         assert 'Neural Networks' in topics
         assert len(topics) >= 2
     
+    def test_detect_topics_matches_overlapping_keywords(self, orchestrator):
+        """Test keywords inside other words and across topics are all found"""
+        topics = orchestrator._detect_topics("Our GPT-based chatbot uses a reward model")
+        
+        assert topics == [
+            'Machine Learning', 'NLP', 'Generative AI', 'Reinforcement Learning'
+        ]
+        assert orchestrator._detect_topics("Hello there!") == []
+    
+    def test_detect_topics_ignores_case(self, orchestrator):
+        """Test keywords match regardless of capitalization"""
+        topics = orchestrator._detect_topics("COMPUTER VISION and Reinforcement LEARNING")
+        
+        assert topics == ['Computer Vision', 'Reinforcement Learning']
+    
+    def test_build_system_prompt_reuses_composed_prompt(self, orchestrator):
+        """Test an unchanged student state reuses the cached prompt"""
+        context = orchestrator._retrieve_context("What is AI?")
+        
+        first = orchestrator._build_system_prompt(context)
+        second = orchestrator._build_system_prompt(dict(context))
+        
+        assert first is second
+        assert "- Level: Beginner" in first
+    
     def test_process_message_flow(self, orchestrator, mock_anthropic_client):
         """Test complete message processing flow"""
         response = orchestrator.process_message(
@@ -107,7 +170,139 @@ class TestEducationalAgentOrchestrator:
         
         # Check that Claude was called
         client = mock_anthropic_client.return_value
-        assert client.messages.create.called
+        assert client.messages.stream.called
+    
+    def test_process_message_with_web_search(self, orchestrator, mock_anthropic_client):
+        """Test search results are added to the prompt when current info is needed"""
+        response = orchestrator.process_message("What is the latest in generative AI?")
+        
+        assert response['tools_used'] == ['web_search']
+        client = mock_anthropic_client.return_value
+        sent = client.messages.stream.call_args.kwargs['messages']
+        assert '[Current Information]' in sent[-1]['content']
+    
+    def test_stream_message_yields_tokens_then_result(self, orchestrator):
+        """Test streaming yields each text chunk before the final response"""
+        frames = list(orchestrator.stream_message("What is AI?", allow_web_search=False))
+        
+        deltas = [delta for delta, result in frames if result is None]
+        final_delta, response = frames[-1]
+        
+        assert deltas == ["Machine learning ", "is a subset of AI..."]
+        assert final_delta == ''
+        assert response['message'] == ''.join(deltas)
+        assert len(orchestrator.conversation_history) == 2
+    
+    def test_concurrent_turns_run_one_at_a_time(self, orchestrator):
+        """Test two requests for one session don't interleave their turns"""
+        import threading
+        import time
+        
+        active = []
+        overlaps = []
+        def slow_completion(system_prompt, messages):
+            active.append(1)
+            overlaps.append(len(active))
+            time.sleep(0.05)
+            active.pop()
+            yield "Answer"
+        
+        with patch.object(orchestrator, '_stream_completion', side_effect=slow_completion):
+            threads = [
+                threading.Thread(
+                    target=orchestrator.process_message,
+                    args=(f"Question {i}",),
+                    kwargs={'allow_web_search': False}
+                )
+                for i in range(2)
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        assert overlaps == [1, 1]
+        assert len(orchestrator.conversation_history) == 4
+    
+    def test_failing_tool_does_not_fail_turn(self, orchestrator):
+        """Test a tool error is isolated from the rest of the turn"""
+        with patch.object(orchestrator.web_search, 'search', side_effect=RuntimeError("down")):
+            response = orchestrator.process_message("What is the latest in generative AI?")
+        
+        assert response['message']
+        assert 'web_search' not in response['tools_used']
+    
+    def test_turn_records_share_timestamp(self, orchestrator):
+        """Test every record written during a turn uses one timestamp"""
+        response = orchestrator.process_message("What is NLP?", allow_web_search=False)
+        
+        event = orchestrator.session_manager.events[-1]
+        messages = orchestrator.session_manager.get_recent_messages(limit=2)
+        assert event['timestamp'] == response['timestamp']
+        assert all(m['timestamp'] == response['timestamp'] for m in messages)
+        assert orchestrator.student_profile['last_active'] == response['timestamp']
+        assert all(
+            i['timestamp'] == response['timestamp'] for i in orchestrator.memory.memory_store.values()
+        )
+    
+    @staticmethod
+    def _generate(orchestrator, question):
+        """Run one response generation and return its result, then forget the exchange"""
+        turn = orchestrator._generate_response(question, orchestrator._retrieve_context(question))
+        try:
+            while True:
+                next(turn)
+        except StopIteration as done:
+            orchestrator.conversation_history.clear()
+            return done.value
+    
+    def test_response_cache_disabled_by_default(self, orchestrator):
+        """Test no response cache is used unless one is configured"""
+        other = EducationalAgentOrchestrator(anthropic_api_key="test_key", student_id="another_student")
+        assert other.response_cache is None
+    
+    def test_repeated_question_served_from_cache(self, orchestrator, mock_anthropic_client):
+        """Test a repeated question skips the Claude API call as the session moves on"""
+        orchestrator.response_cache = CentroidCache(threshold=0.97)
+        
+        orchestrator.process_message("What is machine learning?", allow_web_search=False)
+        response = orchestrator.process_message("what is machine learning", allow_web_search=False)
+        
+        # The first turn changed the history and progress in the prompt
+        client = mock_anthropic_client.return_value
+        assert client.messages.stream.call_count == 1
+        assert 'semantic_cache' in response['tools_used']
+        assert response['message'] == "Machine learning is a subset of AI..."
+    
+    def test_cached_response_shared_within_level(self, orchestrator, mock_anthropic_client):
+        """Test answers are reused for students at the same level only"""
+        cache = CentroidCache(threshold=0.97)
+        orchestrator.response_cache = cache
+        classmate, advanced = (
+            EducationalAgentOrchestrator(
+                anthropic_api_key="test_key",
+                student_id=student_id,
+                response_cache=cache
+            )
+            for student_id in ("classmate", "advanced_student")
+        )
+        advanced.profile_manager.update_fields(level='Advanced')
+        
+        self._generate(orchestrator, "What is machine learning?")
+        assert 'semantic_cache' in self._generate(classmate, "What is machine learning?")['tools_used']
+        assert 'semantic_cache' not in self._generate(advanced, "What is machine learning?")['tools_used']
+        assert 'semantic_cache' not in self._generate(classmate, "What is machine learning in Java?")['tools_used']
+        
+        assert mock_anthropic_client.return_value.messages.stream.call_count == 3
+    
+    def test_follow_up_question_not_cached(self, orchestrator, mock_anthropic_client):
+        """Test follow-ups without topic keywords always reach Claude"""
+        orchestrator.response_cache = CentroidCache(threshold=0.97)
+        orchestrator.process_message("Can you give an example?", allow_web_search=False)
+        orchestrator.process_message("Can you give an example?", allow_web_search=False)
+        
+        client = mock_anthropic_client.return_value
+        assert client.messages.stream.call_count == 2
     
     def test_update_learning_graph(self, orchestrator):
         """Test learning graph updates"""
@@ -128,6 +323,34 @@ class TestEducationalAgentOrchestrator:
         assert 'Machine Learning' in orchestrator.student_profile['topics']
         assert 'Neural Networks' in orchestrator.student_profile['topics']
     
+    def test_update_learning_graph_counts_questions(self, orchestrator):
+        """Test each turn increments the persisted question count"""
+        initial_questions = orchestrator.student_profile['total_questions']
+        response = {'content': 'Test response', 'topics': [], 'tools_used': []}
+        
+        orchestrator._update_learning_graph("First", response)
+        orchestrator._update_learning_graph("Second", response)
+        
+        assert orchestrator.student_profile['total_questions'] == initial_questions + 2
+        stored = orchestrator.profile_manager.get_or_create_profile()
+        assert stored['total_questions'] == initial_questions + 2
+    
+    def test_concurrent_sessions_keep_each_others_topics(self, orchestrator):
+        """Test two sessions for one student both add to the shared topic list"""
+        other = EducationalAgentOrchestrator(
+            anthropic_api_key="test_key",
+            student_id="test_student_123"
+        )
+        
+        orchestrator._update_learning_graph("Q", {'content': '', 'topics': ['NLP'], 'tools_used': []})
+        other._update_learning_graph("Q", {'content': '', 'topics': ['AI Ethics'], 'tools_used': []})
+        
+        orchestrator.profile_manager.flush()
+        assert orchestrator.student_profile['topics'] == ['NLP', 'AI Ethics']
+        for session in (orchestrator, other):
+            context = session._retrieve_context("What next?")
+            assert context['learned_topics_text'] == 'NLP, AI Ethics'
+    
     def test_calculate_level_progression(self, orchestrator):
         """Test level calculation based on progress"""
         assert orchestrator._calculate_level(0, 0) == 'Beginner'
@@ -135,6 +358,11 @@ class TestEducationalAgentOrchestrator:
         assert orchestrator._calculate_level(35, 4) == 'Intermediate'
         assert orchestrator._calculate_level(65, 7) == 'Advanced'
         assert orchestrator._calculate_level(90, 10) == 'Expert'
+        
+        # Both progress and topic thresholds must be met
+        assert orchestrator._calculate_level(90, 1) == 'Beginner'
+        assert orchestrator._calculate_level(10, 10) == 'Beginner'
+        assert orchestrator._calculate_level(90, 6) == 'Advanced'
     
     def test_teacher_override(self, orchestrator):
         """Test teacher override functionality"""
@@ -153,14 +381,10 @@ class TestEducationalAgentOrchestrator:
     def test_get_session_summary(self, orchestrator):
         """Test session summary generation"""
         # Add some conversation
-        orchestrator.conversation_history.append({
-            'role': 'user',
-            'content': 'What is AI?'
-        })
-        orchestrator.conversation_history.append({
-            'role': 'assistant',
-            'content': 'AI is...'
-        })
+        orchestrator.session_manager.append_turn([
+            {'role': 'user', 'content': 'What is AI?'},
+            {'role': 'assistant', 'content': 'AI is...'}
+        ])
         
         summary = orchestrator.get_session_summary()
         
@@ -186,6 +410,20 @@ class TestEducationalAgentOrchestrator:
         assert orchestrator.conversation_history[0]['role'] == 'user'
         assert orchestrator.conversation_history[1]['role'] == 'assistant'
     
+    def test_conversation_history_is_bounded(self, orchestrator, mock_anthropic_client):
+        """Test only the most recent exchanges are kept and sent to Claude"""
+        for i in range(8):
+            orchestrator.process_message(f"Question {i}", allow_web_search=False)
+        
+        assert len(orchestrator.conversation_history) == 10
+        assert orchestrator.conversation_history[0]['content'] == "Question 3"
+        
+        client = mock_anthropic_client.return_value
+        sent = client.messages.stream.call_args.kwargs['messages']
+        assert sent[0] == {'role': 'user', 'content': 'Question 2'}
+        assert len(sent) == 11
+        assert orchestrator.get_session_summary()['messages_count'] == 16
+    
     def test_reset_session(self, orchestrator):
         """Test session reset"""
         old_session_id = orchestrator.session_id
@@ -193,8 +431,12 @@ class TestEducationalAgentOrchestrator:
         # Add some data
         orchestrator.conversation_history.append({'test': 'data'})
         
-        # Reset
-        orchestrator.reset_session()
+        # Reset; ids are timestamped to the second, so pin the next one
+        with patch.object(
+            orchestrator, '_generate_session_id',
+            return_value="session_test_student_123_next"
+        ):
+            orchestrator.reset_session()
         
         # Check new session created
         assert orchestrator.session_id != old_session_id
@@ -221,6 +463,200 @@ class TestAgentTools:
         assert isinstance(results, str)
         assert len(results) > 0
     
+    def test_web_search_simulation_prefers_table_order(self):
+        """Test the first matching simulated topic in the table is used"""
+        tool = WebSearchTool(api_key=None)
+        results = tool.search("Are neural networks part of Machine Learning?")
+        
+        assert "Latest Advances in Machine Learning" in results
+        assert "Current information" in tool.search("What about robotics?")
+    
+    def test_web_search_coalesces_concurrent_queries(self):
+        """Test identical in-flight searches share a single API call"""
+        import threading
+        
+        joined = threading.Event()
+        
+        class InflightSearches(dict):
+            def get(self, key, default=None):
+                future = super().get(key, default)
+                if future is not None:
+                    joined.set()
+                return future
+        
+        tool = WebSearchTool(api_key="test_key")
+        response = Mock(status_code=200, headers={})
+        response.json.return_value = {'web': {'results': [{'title': 'GPT news'}]}}
+        
+        def slow_get(*args, **kwargs):
+            # Hold the leader's call open until the follower has joined it
+            joined.wait(timeout=5)
+            return response
+        
+        inflight = InflightSearches()
+        with patch.object(WebSearchTool._client, 'get', side_effect=slow_get) as mock_get, \
+                patch.object(WebSearchTool, '_inflight', inflight), \
+                patch.object(WebSearchTool, 'MIN_INTERVAL', 0), \
+                patch.dict('agents.tools._SEARCH_CACHE', clear=True):
+            results = []
+            threads = [
+                threading.Thread(target=lambda q=q: results.append(tool.search(q)))
+                for q in ("latest GPT news", "Latest  GPT news")
+            ]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        
+        assert mock_get.call_count == 1
+        assert len(results) == 2 and results[0] == results[1]
+        assert "GPT news" in results[0]
+        assert not inflight
+    
+    def test_web_search_leader_failure_releases_followers(self):
+        """Test a failing search fails its followers too and isn't left in flight"""
+        import threading
+        
+        joined = threading.Event()
+        
+        class InflightSearches(dict):
+            def get(self, key, default=None):
+                future = super().get(key, default)
+                if future is not None:
+                    joined.set()
+                return future
+        
+        tool = WebSearchTool(api_key="test_key")
+        
+        def failing_fetch(query, num_results):
+            joined.wait(timeout=5)
+            raise ValueError("bad payload")
+        
+        inflight = InflightSearches()
+        with patch.object(tool, '_fetch', side_effect=failing_fetch), \
+                patch.object(WebSearchTool, '_inflight', inflight), \
+                patch.dict('agents.tools._SEARCH_CACHE', clear=True):
+            errors = []
+            def search():
+                try:
+                    tool.search("latest GPT news")
+                except ValueError as e:
+                    errors.append(e)
+            
+            threads = [threading.Thread(target=search) for _ in range(2)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join(timeout=5)
+        
+        assert len(errors) == 2
+        assert not inflight
+    
+    def test_web_search_caches_repeated_queries(self):
+        """Test a search differing only in case and punctuation is answered from the cache"""
+        tool = WebSearchTool(api_key="test_key")
+        response = Mock(status_code=200, headers={})
+        response.json.return_value = {'web': {'results': [{'title': 'GPT news'}]}}
+        
+        with patch.object(WebSearchTool._client, 'get', return_value=response) as mock_get, \
+                patch.object(WebSearchTool, 'MIN_INTERVAL', 0), \
+                patch.dict('agents.tools._SEARCH_CACHE', clear=True):
+            first = tool.search("latest news about GPT models")
+            second = tool.search("Latest news about GPT models!")
+        
+        assert mock_get.call_count == 1
+        assert second == first
+    
+    def test_web_search_similar_queries_not_shared(self):
+        """Test searches differing in a year or language each call the API"""
+        tool = WebSearchTool(api_key="test_key")
+        response = Mock(status_code=200, headers={})
+        response.json.return_value = {'web': {'results': [{'title': 'News'}]}}
+        
+        with patch.object(WebSearchTool._client, 'get', return_value=response) as mock_get, \
+                patch.object(WebSearchTool, 'MIN_INTERVAL', 0), \
+                patch.dict('agents.tools._SEARCH_CACHE', clear=True):
+            tool.search("latest breakthroughs in robotics in 2024")
+            tool.search("latest breakthroughs in robotics in 2025")
+            tool.search("newest machine learning libraries in python")
+            tool.search("newest machine learning libraries in java")
+        
+        assert mock_get.call_count == 4
+    
+    def test_web_search_failures_not_cached(self):
+        """Test simulated fallback results are not cached"""
+        tool = WebSearchTool(api_key="test_key")
+        
+        with patch.object(WebSearchTool._client, 'get', return_value=Mock(status_code=429, headers={})) as mock_get, \
+                patch.object(WebSearchTool, 'MIN_INTERVAL', 0), \
+                patch.dict('agents.tools._SEARCH_CACHE', clear=True):
+            tool.search("latest machine learning news")
+            result = tool.search("latest machine learning news")
+        
+        assert mock_get.call_count == 2
+        assert "Machine Learning" in result
+    
+    def test_web_search_backs_off_when_rate_limited(self):
+        """Test exhausted rate limit headers delay the next request"""
+        import time
+        
+        with patch.object(WebSearchTool, '_next_request_at', 0.0):
+            WebSearchTool._update_pacing({
+                'X-RateLimit-Remaining': '0, 14000',
+                'X-RateLimit-Reset': '3, 86400'
+            })
+            
+            assert WebSearchTool._next_request_at > time.monotonic() + 2
+    
+    def test_web_search_pacing_sleeps_outside_lock(self):
+        """Test waiting searches reserve successive slots without holding the lock"""
+        import time
+        
+        delays = []
+        def fake_sleep(delay):
+            assert not WebSearchTool._pace_lock.locked()
+            delays.append(delay)
+        
+        with patch.object(WebSearchTool, '_next_request_at', time.monotonic() + 1), \
+             patch('agents.tools.time.sleep', side_effect=fake_sleep):
+            assert WebSearchTool._wait_for_slot()
+            assert WebSearchTool._wait_for_slot()
+        
+        assert len(delays) == 2
+        assert delays[1] - delays[0] == pytest.approx(WebSearchTool.MIN_INTERVAL, abs=0.1)
+    
+    def test_web_search_falls_back_when_rate_limit_wait_too_long(self):
+        """Test a search doesn't queue past MAX_PACING_WAIT for its slot"""
+        import time
+        
+        tool = WebSearchTool(api_key="test_key")
+        
+        with patch.object(WebSearchTool, '_next_request_at', time.monotonic() + 60), \
+                patch.object(WebSearchTool._client, 'get') as mock_get, \
+                patch('agents.tools.time.sleep') as mock_sleep, \
+                patch.dict('agents.tools._SEARCH_CACHE', clear=True):
+            result = tool.search("latest machine learning news")
+            
+            assert WebSearchTool._next_request_at > time.monotonic() + 50
+        
+        assert not mock_get.called
+        assert not mock_sleep.called
+        assert "Machine Learning" in result
+    
+    def test_web_search_follower_gives_up_on_hung_leader(self):
+        """Test a search joined to a stuck in-flight call times out to simulated results"""
+        from concurrent.futures import Future
+        
+        tool = WebSearchTool(api_key="test_key")
+        inflight = {("latest machine learning news", 5): Future()}
+        
+        with patch.object(WebSearchTool, '_inflight', inflight), \
+                patch.object(WebSearchTool, 'INFLIGHT_TIMEOUT', 0.01), \
+                patch.dict('agents.tools._SEARCH_CACHE', clear=True):
+            result = tool.search("Latest machine learning news?")
+        
+        assert "Machine Learning" in result
+    
     def test_memory_tool_schema(self):
         """Test memory tool returns correct schema"""
         tool = MemoryTool(student_id="test_123")
@@ -236,6 +672,71 @@ class TestAgentTools:
         
         assert isinstance(results, list)
     
+    def test_memory_tool_ranks_stored_interactions(self):
+        """Test stored interactions are returned most similar first"""
+        tool = MemoryTool(student_id="test_123")
+        tool.store_interaction("What is computer vision?", "CV is...", ['Computer Vision'])
+        tool.store_interaction("Where is machine learning used?", "In medicine...", ['Machine Learning'])
+        tool.store_interaction("What is machine learning?", "ML is...", ['Machine Learning'])
+        tool.store_interaction("How do chatbots work?", "Chatbots...", ['NLP'])
+        
+        results = tool.find_similar("what is machine learning", limit=3)
+        
+        assert [r['response'] for r in results] == ["ML is...", "In medicine..."]
+    
+    def test_memory_tool_ignores_stop_word_matches(self):
+        """Test sharing only words like "what is" doesn't make interactions related"""
+        tool = MemoryTool(student_id="test_123")
+        tool.store_interaction("What is computer vision?", "CV is how computers see", ['Computer Vision'])
+        
+        assert tool.find_similar("What is NLP?") == []
+    
+    def test_memory_tool_hybrid_matches_exact_terms(self):
+        """Test exact terms found only in a past response are retrieved"""
+        tool = MemoryTool(student_id="test_123")
+        tool.store_interaction("Tell me about image models", "ResNet uses skip connections", [])
+        tool.store_interaction("What is a neural network?", "Layers of neurons", [])
+        tool.store_interaction("What is the best model?", "It depends", [])
+        
+        results = tool.find_similar("Why does ResNet work?", limit=1)
+        
+        assert results[0]['response'] == "ResNet uses skip connections"
+    
+    def test_memory_tool_skips_unrelated_interactions(self):
+        """Test interactions below the similarity threshold are not returned"""
+        tool = MemoryTool(student_id="test_123")
+        tool.store_interaction("What is machine learning?", "ML is...", ['Machine Learning'])
+        tool.store_interaction("How do robots see?", "Cameras...", ['Computer Vision'])
+        
+        results = tool.find_similar("What is machine learning", limit=3)
+        
+        assert [r['response'] for r in results] == ["ML is..."]
+    
+    def test_memory_tool_quantized_similarity(self):
+        """Test int8 vectors keep similarities close to full precision"""
+        import numpy as np
+        from memory.cache import embed_text
+        
+        tool = MemoryTool(student_id="test_123")
+        tool.store_interaction("How are neural networks trained?", "Backprop...", [])
+        
+        results = tool.find_similar("How are deep neural networks trained", limit=1)
+        expected = float(embed_text("How are neural networks trained?")
+                         @ embed_text("How are deep neural networks trained"))
+        
+        assert tool._vectors.dtype == np.int8
+        assert abs(results[0]['similarity'] - expected) < 0.02
+    
+    def test_memory_tool_index_grows(self):
+        """Test the index keeps every interaction past its initial capacity"""
+        tool = MemoryTool(student_id="test_123")
+        for i in range(40):
+            tool.store_interaction(f"Question number {i}", f"Answer {i}", [])
+        
+        results = tool.find_similar("Question number 33", limit=1)
+        
+        assert results[0]['response'] == "Answer 33"
+    
     def test_analytics_tool_recording(self):
         """Test analytics tool records events"""
         tool = AnalyticsTool(student_id="test_123")
@@ -266,6 +767,39 @@ class TestAgentTools:
         
         assert summary['total_interactions'] == 2
         assert len(summary['topics_explored']) == 3
+    
+    def test_analytics_learning_graph_groups_by_day(self):
+        """Test the learning graph aggregates events per day in date order"""
+        tool = AnalyticsTool(student_id="test_123")
+        tool.record_interaction({'topics': ['NLP'], 'timestamp': '2025-01-02T09:00:00'})
+        tool.record_interaction({'topics': ['Machine Learning'], 'timestamp': '2025-01-01T10:00:00'})
+        tool.record_interaction({'topics': ['NLP', 'AI Ethics'], 'timestamp': '2025-01-02T18:30:00.250000'})
+        
+        graph = tool.generate_learning_graph()
+        
+        assert graph['graph_data'] == [
+            {'date': '2025-01-01', 'interactions': 1, 'unique_topics': 1, 'cumulative_topics': 1},
+            {'date': '2025-01-02', 'interactions': 2, 'unique_topics': 2, 'cumulative_topics': 3}
+        ]
+        assert graph['total_learning_days'] == 2
+        assert graph['total_topics_learned'] == 3
+    
+    def test_knowledge_base_lookup_by_topic_and_level(self):
+        """Test content is only returned for its own level"""
+        tool = KnowledgeBaseTool()
+        
+        content = tool.get_content('neural_networks', 'Intermediate')
+        
+        assert content['title'] == 'Neural Networks Fundamentals'
+        assert tool.get_content('neural_networks', 'Beginner') is None
+        assert tool.get_content('unknown_topic') is None
+    
+    def test_analytics_learning_graph_empty(self):
+        """Test a student without events gets an empty graph"""
+        graph = AnalyticsTool(student_id="test_123").generate_learning_graph()
+        
+        assert graph['graph_data'] == []
+        assert graph['total_learning_days'] == 0
 
 
 @pytest.fixture
@@ -0,0 +1,532 @@
+"""
+Tests for Memory Components
+"""
+
+import pytest
+import sqlite3
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+import numpy as np
+
+from memory.cache import SemanticCache, CentroidCache, embed_text
+from memory.profiles import StudentProfileManager, get_profile_manager
+from memory.session import SessionManager, SessionRegistry, ContextWindow
+
+
+class TestSemanticCache:
+    """Test suite for the semantic response cache"""
+    
+    def test_embed_text_is_normalized(self):
+        """Test embeddings are unit length and deterministic"""
+        vector = embed_text("What is machine learning?")
+        
+        assert np.isclose(np.linalg.norm(vector), 1.0)
+        assert np.array_equal(vector, embed_text("what is MACHINE learning"))
+        assert not embed_text("?!").any()
+    
+    def test_embed_text_reuses_cached_vector(self):
+        """Test texts with the same tokens share one cached, read-only vector"""
+        vector = embed_text("What is a neural network?")
+        
+        assert embed_text("what is a NEURAL network") is vector
+        assert not vector.flags.writeable
+    
+    def test_lookup_hits_similar_query(self):
+        """Test near-duplicate queries return the cached response"""
+        cache = SemanticCache()
+        cache.store("What is machine learning?", "Beginner", "ML answer")
+        
+        assert cache.lookup("what is machine learning", "Beginner") == "ML answer"
+        assert cache.lookup("What is deep learning?", "Beginner") is None
+    
+    def test_lookup_requires_matching_partition(self):
+        """Test responses are only reused within the partition they were stored in"""
+        cache = SemanticCache()
+        cache.store("What is machine learning?", "Beginner", "ML answer")
+        
+        assert cache.lookup("What is machine learning?", "Expert") is None
+    
+    def test_oldest_entry_evicted_when_full(self):
+        """Test the cache is bounded to max_entries"""
+        cache = SemanticCache(max_entries=2)
+        cache.store("What is machine learning?", "Beginner", "ML")
+        cache.store("What is computer vision?", "Beginner", "CV")
+        cache.store("What is reinforcement learning?", "Beginner", "RL")
+        
+        assert cache.lookup("What is machine learning?", "Beginner") is None
+        assert cache.lookup("What is computer vision?", "Beginner") == "CV"
+        assert cache.lookup("What is reinforcement learning?", "Beginner") == "RL"
+    
+    def test_entries_expire_after_ttl(self):
+        """Test entries stop matching once their TTL has passed"""
+        cache = SemanticCache(ttl=60)
+        with patch('memory.cache.time.monotonic', return_value=1000.0):
+            cache.store("What is machine learning?", "5", "results")
+        
+        with patch('memory.cache.time.monotonic', return_value=1059.0):
+            assert cache.lookup("What is machine learning?", "5") == "results"
+        with patch('memory.cache.time.monotonic', return_value=1061.0):
+            assert cache.lookup("What is machine learning?", "5") is None
+
+
+class TestCentroidCache:
+    """Test suite for the clustered semantic cache"""
+    
+    def test_similar_queries_share_a_centroid(self):
+        """Test paraphrases are merged into one cluster"""
+        cache = CentroidCache()
+        cache.store("What is machine learning?", "Beginner", "first")
+        cache.store("what is machine learning exactly?", "Beginner", "second")
+        cache.store("What is computer vision?", "Beginner", "CV")
+        
+        assert cache._size == 2
+        assert cache.lookup("what is machine learning", "Beginner") == "second"
+    
+    def test_responses_kept_per_partition(self):
+        """Test a cluster answers each partition with its own response"""
+        cache = CentroidCache()
+        cache.store("What is machine learning?", "Beginner", "simple")
+        cache.store("What is machine learning?", "Advanced", "detailed")
+        
+        assert cache.lookup("What is machine learning?", "Beginner") == "simple"
+        assert cache.lookup("What is machine learning?", "Advanced") == "detailed"
+        assert cache.lookup("What is machine learning?", "Expert") is None
+
+
+class TestStudentProfileManager:
+    """Test suite for persistent student profiles"""
+    
+    def test_update_fields_persists_changes(self, tmp_path):
+        """Test changed fields are written to storage"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        manager.get_or_create_profile()
+        
+        manager.update_fields(progress=40, level='Intermediate', unknown='ignored')
+        manager.flush()
+        
+        profile = StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        assert profile['progress'] == 40
+        assert profile['level'] == 'Intermediate'
+        assert 'unknown' not in profile
+    
+    def test_profile_loaded_once(self, tmp_path):
+        """Test the profile is read from storage once and then shared"""
+        StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        
+        with patch.object(manager, '_load_profile', wraps=manager._load_profile) as load:
+            profile = manager.get_or_create_profile()
+            manager.add_topic("NLP")
+            manager.increment_progress(5)
+            manager.get_recommendations()
+        
+        assert load.call_count == 1
+        assert manager.get_or_create_profile() is profile
+        assert profile['topics'] == ["NLP"]
+        assert profile['progress'] == 5
+    
+    def test_add_topic_after_topics_replaced(self, tmp_path):
+        """Test topic lookups follow a wholesale replacement of the list"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        manager.add_topic("NLP")
+        manager.update_fields(topics=["Machine Learning"])
+        
+        manager.add_topic("NLP")
+        manager.add_topic("Machine Learning")
+        
+        assert manager.get_or_create_profile()['topics'] == ["Machine Learning", "NLP"]
+    
+    def test_recommendations_follow_level_and_topics(self, tmp_path):
+        """Test recommendations depend on level, prerequisites and known topics"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        manager.add_topic("AI Ethics")
+        assert [r['topic'] for r in manager.get_recommendations()] == ['Machine Learning Basics']
+        
+        manager.update_fields(level='Intermediate')
+        assert [r['topic'] for r in manager.get_recommendations()] == ['Natural Language Processing']
+        
+        manager.add_topic("Machine Learning")
+        assert [r['topic'] for r in manager.get_recommendations()] == [
+            'Neural Networks', 'Natural Language Processing'
+        ]
+        
+        manager.update_fields(level='Expert')
+        assert manager.get_recommendations() == []
+        manager.add_topic("Neural Networks")
+        assert [r['topic'] for r in manager.get_recommendations()] == ['Generative AI']
+    
+    def test_recommendations_are_copies(self, tmp_path):
+        """Test changing a returned recommendation doesn't affect other students"""
+        first = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        first.get_recommendations()[0]['priority'] = 'high'
+        
+        second = StudentProfileManager("student_2", storage_dir=str(tmp_path))
+        assert 'priority' not in second.get_recommendations()[0]
+    
+    def test_shared_manager_sees_unflushed_changes(self, tmp_path):
+        """Test every caller for a student gets the same live manager"""
+        manager = get_profile_manager("student_1", storage_dir=str(tmp_path))
+        manager.increment_progress(10)
+        
+        reader = get_profile_manager("student_1", storage_dir=str(tmp_path))
+        assert reader is manager
+        assert reader.get_or_create_profile()['progress'] == 10
+        assert get_profile_manager("student_2", storage_dir=str(tmp_path)) is not manager
+    
+    def test_update_fields_skips_unchanged_write(self, tmp_path):
+        """Test no write happens when nothing changed"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        profile = manager.get_or_create_profile()
+        
+        with patch.object(manager, '_write_fields') as write:
+            manager.update_fields(progress=profile['progress'], level=profile['level'])
+        
+        assert not write.called
+        assert not manager._dirty
+    
+    def test_changes_buffered_until_flush(self, tmp_path):
+        """Test mutations are held in memory and written together on flush"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        manager.add_topic("NLP")
+        manager.increment_progress(10)
+        
+        with patch.object(manager, '_write_fields', wraps=manager._write_fields) as write:
+            reader = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+            assert reader.get_or_create_profile()['topics'] == []
+            
+            manager.flush()
+            manager.flush()
+        
+        assert write.call_count == 1
+        assert set(write.call_args[0][0]) == {'topics', 'progress'}
+        
+        profile = StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        assert profile['topics'] == ["NLP"]
+        assert profile['progress'] == 10
+    
+    def test_failed_write_leaves_profile_intact(self, tmp_path):
+        """Test a write that fails part-way is rolled back and reported"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        manager.get_or_create_profile()
+        
+        with pytest.raises(KeyError):
+            manager._write_fields({'progress': 50, 'achievements': [{'name': 'No timestamp'}]})
+        
+        profile = StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        assert profile['progress'] == 0
+        assert profile['achievements'] == []
+    
+    def test_failed_flush_keeps_changes_for_retry(self, tmp_path):
+        """Test buffered changes survive a failed flush and are written by the next one"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        manager.increment_progress(10)
+        
+        with patch.object(manager, '_write_fields', side_effect=sqlite3.OperationalError("locked")):
+            with pytest.raises(sqlite3.OperationalError):
+                manager.flush()
+        
+        assert manager._dirty == {'progress'}
+        manager.flush()
+        
+        profile = StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        assert profile['progress'] == 10
+    
+    def test_flushes_after_many_updates(self, tmp_path):
+        """Test a long run of updates is written without an explicit flush"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        
+        for _ in range(StudentProfileManager.FLUSH_AFTER_UPDATES):
+            manager.increment_progress(1)
+        
+        assert not manager._dirty
+        profile = StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        assert profile['progress'] == StudentProfileManager.FLUSH_AFTER_UPDATES
+    
+    def test_topics_and_achievements_persist(self, tmp_path):
+        """Test row-level updates are visible to a fresh manager"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        manager.add_topic("NLP")
+        manager.add_topic("Machine Learning")
+        manager.add_topic("NLP")
+        manager.increment_progress(70)
+        manager.increment_progress(70)
+        manager.add_achievement({'name': 'First Steps', 'description': 'Asked a question'})
+        manager.flush()
+        
+        profile = StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        assert profile['topics'] == ["NLP", "Machine Learning"]
+        assert profile['progress'] == 100
+        assert profile['achievements'][0]['name'] == 'First Steps'
+        assert profile['preferences']['learning_pace'] == 'normal'
+    
+    def test_new_profiles_do_not_share_defaults(self, tmp_path):
+        """Test each new profile gets its own copy of the default containers"""
+        first = StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        second = StudentProfileManager("student_2", storage_dir=str(tmp_path)).get_or_create_profile()
+        
+        first['goals'].append('Learn NLP')
+        first['preferences']['learning_pace'] = 'fast'
+        
+        assert second['goals'] == []
+        assert second['preferences']['learning_pace'] == 'normal'
+        assert first['created_at'] == first['last_active']
+    
+    def test_learning_streak_by_calendar_day(self, tmp_path):
+        """Test the streak grows on consecutive days and restarts after a gap"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        profile = manager.get_or_create_profile()
+        
+        manager.update_learning_streak()
+        assert profile['learning_streak_days'] == 0
+        
+        yesterday = datetime.now() - timedelta(days=1)
+        manager.update_fields(last_active=yesterday.isoformat(), learning_streak_days=3)
+        manager.update_learning_streak()
+        assert profile['learning_streak_days'] == 4
+        
+        last_week = datetime.now() - timedelta(days=7)
+        manager.update_fields(last_active=last_week.isoformat())
+        manager.update_learning_streak()
+        assert profile['learning_streak_days'] == 1
+        
+        manager.update_fields(created_at=last_week.isoformat())
+        assert manager.get_learning_history()['days_since_created'] == 7
+    
+    def test_profiles_are_isolated_per_student(self, tmp_path):
+        """Test students sharing a database don't see each other's data"""
+        manager = StudentProfileManager("student_1", storage_dir=str(tmp_path))
+        manager.add_topic("NLP")
+        manager.flush()
+        
+        profile = StudentProfileManager("student_2", storage_dir=str(tmp_path)).get_or_create_profile()
+        assert profile['topics'] == []
+    
+    def test_legacy_json_profile_imported(self, tmp_path):
+        """Test a profile saved as JSON by earlier versions is carried over"""
+        (tmp_path / "student_1.json").write_text(
+            '{"student_id": "student_1", "level": "Advanced", "progress": 60, "topics": ["NLP"]}'
+        )
+        
+        profile = StudentProfileManager("student_1", storage_dir=str(tmp_path)).get_or_create_profile()
+        assert profile['level'] == 'Advanced'
+        assert profile['topics'] == ["NLP"]
+
+
+class TestSessionManager:
+    """Test suite for session memory"""
+    
+    def test_append_turn_records_all_messages(self):
+        """Test a turn's messages are added with one call"""
+        session = SessionManager("session_1")
+        session.append_turn([
+            {'role': 'user', 'content': 'What is NLP?'},
+            {'role': 'assistant', 'content': 'NLP is...', 'topics': ['NLP']}
+        ])
+        
+        assert [m['role'] for m in session.get_recent_messages()] == ['user', 'assistant']
+        assert session.metadata['message_count'] == 2
+        assert session.get_summary()['topics_discussed'] == ['NLP']
+    
+    def test_topics_discussed_keep_first_mention_order(self):
+        """Test discussed topics are deduplicated in the order first seen"""
+        session = SessionManager("session_1")
+        session.add_message({'role': 'assistant', 'content': 'A1', 'topics': ['NLP', 'AI Ethics']})
+        first = session.get_topics_discussed()
+        first.append('Not discussed')
+        session.add_message({'role': 'assistant', 'content': 'A2', 'topics': ['NLP']})
+        assert session.get_topics_discussed() == ['NLP', 'AI Ethics']
+        
+        session.add_message({'role': 'assistant', 'content': 'A3', 'topics': ['Computer Vision', 'NLP']})
+        
+        assert session.get_summary()['topics_discussed'] == ['NLP', 'AI Ethics', 'Computer Vision']
+        assert session.export_session()['metadata']['topics_discussed'] == [
+            'NLP', 'AI Ethics', 'Computer Vision'
+        ]
+    
+    def test_summary_counts_follow_history_limit(self):
+        """Test role counts cover only messages still held in history"""
+        session = SessionManager("session_1", max_history=3)
+        session.add_message({'role': 'user', 'content': 'Q1'})
+        session.append_turn([
+            {'role': 'assistant', 'content': 'A1'},
+            {'role': 'user', 'content': 'Q2'},
+            {'role': 'assistant', 'content': 'A2'}
+        ])
+        
+        summary = session.get_summary()
+        assert summary['total_messages'] == 3
+        assert summary['user_messages'] == 1
+        assert summary['ai_responses'] == 2
+        assert [m['content'] for m in session.get_recent_messages(limit=2)] == ['Q2', 'A2']
+    
+    def test_event_log_stays_in_storage_dir(self, tmp_path):
+        """Test client-supplied session ids can't place the log elsewhere"""
+        storage = tmp_path / "sessions"
+        session = SessionManager("../../escaped/evil", storage_dir=str(storage))
+        session.add_event({'message': 'hi'})
+        session.close()
+        
+        assert session.events_path.parent == storage.resolve()
+        assert not (tmp_path / "escaped").exists()
+        assert SessionManager("../x", storage_dir=str(storage)).events_path != \
+            SessionManager("_.x", storage_dir=str(storage)).events_path
+    
+    def test_event_log_appends_for_reused_session_id(self, tmp_path):
+        """Test a second manager with the same id keeps the earlier events"""
+        first = SessionManager("session_1", storage_dir=str(tmp_path))
+        first.add_event({'message': 'first'})
+        first.close()
+        
+        second = SessionManager("session_1", storage_dir=str(tmp_path))
+        second.add_event({'message': 'second'})
+        second.close()
+        
+        assert len((tmp_path / "session_1.jsonl").read_bytes().splitlines()) == 2
+        assert [e['message'] for e in second.events] == ['second']
+    
+    def test_format_duration(self):
+        """Test durations are shown in seconds, minutes, or hours and minutes"""
+        session = SessionManager("session_1")
+        
+        assert session._format_duration(42.9) == "42 seconds"
+        assert session._format_duration(61) == "1 minute"
+        assert session._format_duration(3599) == "59 minutes"
+        assert session._format_duration(7380.5) == "2h 3m"
+    
+    def test_events_logged_to_jsonl(self, tmp_path):
+        """Test events are appended to the session's JSONL log"""
+        session = SessionManager("session_1", storage_dir=str(tmp_path))
+        assert session.events == []
+        
+        session.add_event({'message': 'What is NLP?', 'timestamp': 't1'})
+        session.add_event({'message': 'What is ML?', 'timestamp': 't2'})
+        session.close()
+        
+        lines = (tmp_path / "session_1.jsonl").read_bytes().splitlines()
+        assert len(lines) == 2
+        assert [e['event_id'] for e in session.events] == ["session_1_0", "session_1_1"]
+        assert session.get_summary()['events_count'] == 2
+        
+        session.add_event({'message': 'After close'})
+        assert session.events[-1]['event_id'] == "session_1_2"
+    
+    def test_export_bytes_round_trips(self):
+        """Test the serialized export matches the export dict"""
+        import orjson
+        
+        session = SessionManager("session_1")
+        session.append_turn([
+            {'role': 'user', 'content': 'What is NLP?'},
+            {'role': 'assistant', 'content': 'NLP is...', 'topics': ['NLP']}
+        ])
+        
+        exported = orjson.loads(session.export_bytes())
+        assert exported['session_id'] == "session_1"
+        assert exported['metadata']['topics_discussed'] == ['NLP']
+        assert len(exported['messages']) == 2
+
+
+class TestContextWindow:
+    """Test suite for LLM context assembly"""
+    
+    def test_build_context_keeps_recent_messages_within_budget(self):
+        """Test the most recent messages that fit the token budget are kept in order"""
+        window = ContextWindow(max_tokens=30)
+        messages = [
+            {'role': 'user', 'content': 'a' * 40, 'timestamp': 't1'},
+            {'role': 'assistant', 'content': 'b' * 40},
+            {'role': 'user', 'content': 'c' * 40}
+        ]
+        
+        context = window.build_context('s' * 40, messages)
+        
+        assert context == [
+            {'role': 'assistant', 'content': 'b' * 40},
+            {'role': 'user', 'content': 'c' * 40}
+        ]
+        assert window.build_context('s' * 200, messages) == []
+    
+    def test_prioritize_context_keeps_topic_messages(self):
+        """Test older messages mentioning a topic are kept alongside recent ones"""
+        messages = [
+            {'role': 'user', 'content': 'Tell me about NEURAL networks'},
+            {'role': 'user', 'content': 'What about cooking?'},
+            {'role': 'user', 'content': 'How does nlp (language) work?'},
+        ] + [{'role': 'assistant', 'content': f'Reply {i}'} for i in range(3)]
+        
+        prioritized = ContextWindow().prioritize_context(messages, ['Neural Networks', 'NLP (language)'])
+        
+        assert [m['content'] for m in prioritized[:2]] == [
+            'Tell me about NEURAL networks', 'How does nlp (language) work?'
+        ]
+        assert prioritized[2:] == messages[-3:]
+        assert ContextWindow().prioritize_context(messages, []) == messages[-3:]
+
+
+class TestSessionRegistry:
+    """Test suite for the live session registry"""
+    
+    def test_lookup_by_key_and_session(self):
+        """Test entries are found by key and by session id"""
+        registry = SessionRegistry()
+        agent = object()
+        registry.put("student_1_new", agent, "session_abc")
+        
+        assert registry.get("student_1_new") is agent
+        assert registry.get_by_session("session_abc") is agent
+        assert registry.get_by_session("missing") is None
+        assert len(registry) == 1
+    
+    def test_reused_key_drops_old_session(self):
+        """Test a key reused for a new session stops answering for the old one"""
+        registry = SessionRegistry()
+        registry.put("student_1_new", "first", "session_a")
+        registry.put("student_1_new", "second", "session_b")
+        
+        assert registry.get_by_session("session_a") is None
+        assert registry.get_by_session("session_b") == "second"
+        assert registry.pop_session("session_a") is None
+        assert registry.get("student_1_new") == "second"
+    
+    def test_pop_session_removes_entry(self):
+        """Test ending a session drops both indexes"""
+        registry = SessionRegistry()
+        agent = object()
+        registry.put("student_1_new", agent, "session_abc")
+        
+        assert registry.pop_session("session_abc") is agent
+        assert registry.get("student_1_new") is None
+        assert registry.pop_session("session_abc") is None
+    
+    def test_idle_entries_evicted(self):
+        """Test sessions unused past the idle timeout are dropped"""
+        registry = SessionRegistry(idle_timeout=60)
+        with patch('memory.session.time.monotonic', return_value=1000.0):
+            registry.put("student_1_new", "stale", "session_1")
+            registry.put("student_2_new", "active", "session_2")
+        with patch('memory.session.time.monotonic', return_value=1050.0):
+            registry.get("student_2_new")
+        
+        with patch('memory.session.time.monotonic', return_value=1070.0):
+            assert registry.get_by_session("session_1") is None
+            assert registry.get_by_session("session_2") == "active"
+            assert len(registry) == 1
+    
+    def test_dropped_entries_passed_to_on_evict(self):
+        """Test idle and replaced entries are handed to the teardown callback"""
+        closed = []
+        registry = SessionRegistry(idle_timeout=60, on_evict=closed.append)
+        with patch('memory.session.time.monotonic', return_value=1000.0):
+            registry.put("student_1_new", "stale", "session_1")
+            registry.put("student_2_new", "first", "session_2")
+            registry.put("student_2_new", "second", "session_3")
+        assert closed == ["first"]
+        
+        with patch('memory.session.time.monotonic', return_value=1070.0):
+            registry.put("student_3_new", "fresh", "session_4")
+        assert closed == ["first", "stale", "second"]
+        
+        # Ending a session is the caller's teardown, not an eviction
+        registry.pop_session("session_4")
+        assert closed == ["first", "stale", "second"]
@@ -0,0 +1,29 @@
+"""
+Tests for Utilities
+"""
+
+from datetime import datetime, timedelta
+from unittest.mock import patch
+
+from utils.clock import fast_iso_now
+
+
+class TestFastIsoNow:
+    """Test suite for the cached timestamp formatter"""
+    
+    def test_matches_datetime_isoformat(self):
+        """Test the timestamp is local time in isoformat with microseconds"""
+        before = datetime.now()
+        stamp = datetime.fromisoformat(fast_iso_now())
+        after = datetime.now()
+        
+        assert before - timedelta(microseconds=1) <= stamp <= after
+    
+    def test_reformats_when_second_changes(self):
+        """Test the cached date part is refreshed on a new second"""
+        base = int(datetime(2025, 3, 1, 23, 59, 59).timestamp())
+        
+        with patch('utils.clock.time.time_ns', return_value=base * 10**9 + 5_000):
+            assert fast_iso_now() == "2025-03-01T23:59:59.000005"
+        with patch('utils.clock.time.time_ns', return_value=(base + 1) * 10**9):
+            assert fast_iso_now() == "2025-03-02T00:00:00.000000"
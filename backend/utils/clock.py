@@ -0,0 +1,33 @@
+"""
+Clock Utilities
+Fast timestamps for per-event records
+"""
+
+from datetime import datetime
+import time
+
+# (epoch second, "YYYY-MM-DDTHH:MM:SS") of the most recent call; replaced as
+# one tuple so concurrent callers never see a mismatched pair
+_last_second = (None, '')
+
+
+def fast_iso_now() -> str:
+    """
+    Current local time as an ISO 8601 string with microseconds
+    
+    Same value as datetime.now().isoformat(timespec='microseconds'), but the
+    date and time of day are only formatted once per second.
+    
+    Returns:
+        Timestamp like 2025-01-31T14:05:09.123456
+    """
+    global _last_second
+    
+    second, micros = divmod(time.time_ns() // 1000, 1_000_000)
+    cached_second, prefix = _last_second
+    
+    if second != cached_second:
+        prefix = datetime.fromtimestamp(second).strftime('%Y-%m-%dT%H:%M:%S')
+        _last_second = (second, prefix)
+    
+    return f"{prefix}.{micros:06d}"
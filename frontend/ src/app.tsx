@@ -7,6 +7,7 @@ interface Message {
   content: string;
   timestamp?: string;
   topics?: string[];
+  streaming?: boolean;
 }
 
 interface LearnerProfile {
@@ -51,6 +52,8 @@ const App: React.FC = () => {
   });
   const messagesEndRef = useRef<HTMLDivElement>(null);
   const wsRef = useRef<WebSocket | null>(null);
+  // Whether a reply is being streamed over the WebSocket
+  const wsTurnRef = useRef(false);
 
   useEffect(() => {
     localStorage.setItem('studentId', studentId);
@@ -75,10 +78,28 @@ const App: React.FC = () => {
       
       ws.onmessage = (event) => {
         const data = JSON.parse(event.data);
-        if (data.type === 'message') {
-          handleServerResponse(data.data);
-        } else if (data.type === 'progress') {
-          updateProfile(data.data);
+        // Frames sent close together arrive as one batch
+        const frames = data.type === 'batch' ? data.items : [data];
+        frames.forEach((frame: any) => {
+          if (frame.type === 'token') {
+            appendToken(frame.data);
+          } else if (frame.type === 'message') {
+            finishStreamedResponse(frame.data);
+          } else if (frame.type === 'progress') {
+            updateProfile(frame.data);
+          } else if (frame.type === 'error') {
+            console.error('Server error:', frame.data?.message);
+            abortStreamedResponse();
+          }
+        });
+      };
+
+      // A dropped socket ends the reply in progress; later sends use REST
+      ws.onerror = () => abortStreamedResponse();
+      ws.onclose = () => {
+        abortStreamedResponse();
+        if (wsRef.current === ws) {
+          wsRef.current = null;
         }
       };
 
@@ -116,6 +137,14 @@ const App: React.FC = () => {
     setIsLoading(true);
     setSessionData(prev => ({ ...prev, questionsAsked: prev.questionsAsked + 1 }));
 
+    const ws = wsRef.current;
+    if (ws && ws.readyState === WebSocket.OPEN) {
+      // Streamed over the WebSocket; loading ends with the final frame
+      wsTurnRef.current = true;
+      ws.send(JSON.stringify({ message: userMessage, allow_web_search: true }));
+      return;
+    }
+
     try {
       // Use REST API
       const response = await fetch(`${API_URL}/api/message`, {
@@ -154,6 +183,54 @@ const App: React.FC = () => {
       topics: data.topics_detected 
     }]);
 
+    updateLearnerState(data);
+  };
+
+  // Streamed reply text: extend the reply in progress, or start one
+  const appendToken = (delta: string) => {
+    setMessages(prev => {
+      const last = prev[prev.length - 1];
+      if (last?.role === 'assistant' && last.streaming) {
+        return [...prev.slice(0, -1), { ...last, content: last.content + delta }];
+      }
+      return [...prev, { role: 'assistant', content: delta, streaming: true }];
+    });
+  };
+
+  // Final frame of a streamed reply: metadata only, the text came as tokens
+  const finishStreamedResponse = (data: any) => {
+    setMessages(prev => {
+      const last = prev[prev.length - 1];
+      if (last?.role === 'assistant' && last.streaming) {
+        return [...prev.slice(0, -1), { ...last, streaming: false, topics: data.topics_detected }];
+      }
+      return [...prev, { role: 'assistant', content: data.message || '', topics: data.topics_detected }];
+    });
+    wsTurnRef.current = false;
+    setIsLoading(false);
+
+    updateLearnerState(data);
+  };
+
+  // Streamed reply cut short by a server error or a closed socket
+  const abortStreamedResponse = () => {
+    if (!wsTurnRef.current) return;
+    wsTurnRef.current = false;
+
+    setMessages(prev => {
+      const last = prev[prev.length - 1];
+      const finished = last?.role === 'assistant' && last.streaming
+        ? [...prev.slice(0, -1), { ...last, streaming: false }]
+        : prev;
+      return [...finished, {
+        role: 'assistant',
+        content: 'I\'m having trouble connecting right now. Please try again in a moment.'
+      }];
+    });
+    setIsLoading(false);
+  };
+
+  const updateLearnerState = (data: any) => {
     // Update profile
     setLearnerProfile(prev => ({
       ...prev,